@@ -1,3 +1,4 @@
+import functools
 import numpy as np
 
 # Chetyrkin, Kniehl, Steinhauser, Nucl. Phys. B 510 (1998) 61
@@ -16,7 +17,7 @@ def get_beta2(nf):
     return (2857/2 - 5033/18*nf + 325/54*nf**2) / 64
 
 def get_beta3(nf):
-    return ((149753/6 + 3564*zeta3 + (-1078361/162 - 6508/27*zeta3))*nf +
+    return (149753/6 + 3564*zeta3 + (-1078361/162 - 6508/27*zeta3)*nf +
         (50065/162 + 6472/81*zeta3)*nf**2 + 1093/729*nf**3) / 256
 
 betas = {nf : np.array([get_beta0(nf), get_beta1(nf), get_beta2(nf), get_beta3(nf)])
@@ -24,8 +25,14 @@ betas = {nf : np.array([get_beta0(nf), get_beta1(nf), get_beta2(nf), get_beta3(n
 
 omegas = {nf: (b / b[0])[1:] for nf, b in betas.items()}
 
+# Row nf holds betas[nf] and omegas[nf], nf may then be an array
+beta_table  = np.array([np.full(4, np.nan)] + [betas[nf] for nf in range(1, 7)])
+omega_table = np.array([np.full(3, np.nan)] + [omegas[nf] for nf in range(1, 7)])
+
 def alpha_s_over_pi(s, nf, lam=0.25):
-    beta0, (b1, b2, b3) = betas[nf][0], omegas[nf]
+    """ Asymptotic 4-loop expansion. s, nf and lam are broadcast """
+    beta0 = beta_table[nf, 0]
+    b1, b2, b3 = omega_table[nf, 0], omega_table[nf, 1], omega_table[nf, 2]
     L = np.log(s / lam**2)
     logL = np.log(L)
     beta0LInv = 1 / (beta0 * L)
@@ -66,3 +73,80 @@ def alpha_s_over_pi_v1(s, nf, lamb=0.25):
         (b1**3*(-2*lcube + 2*lsq + 4*l - 1) - 6*b0*b2*b1*l + b0**2*b3) / (2*b0sq_t**3)
     ) / (b0 * t)
 
+
+
+MZ = 91.1876
+ASMZ = 0.1179
+# MSbar masses m_h(m_h) of the heavy quarks, used as decoupling scales
+MC, MB, MT = 1.27, 4.18, 162.5
+
+def rg_beta(a, nf):
+    """ da/dln(mu^2) at four loops for a = alpha_s / pi """
+    b0, b1, b2, b3 = betas[nf]
+    return -a**2 * (b0 + a*(b1 + a*(b2 + a*b3)))
+
+def decouple_coefs(nl):
+    """ a^(nl) = a^(nl+1) (1 + c2 a^2 + c3 a^3) at mu = m_h(m_h), CKS eq. (27) """
+    return 11/72, 564731/124416 - 82043/27648*zeta3 - 2633/31104*nl
+
+def decouple_down(a, nl):
+    c2, c3 = decouple_coefs(nl)
+    return a * (1 + c2*a**2 + c3*a**3)
+
+def decouple_up(a, nl):
+    c2, c3 = decouple_coefs(nl)
+    return a * (1 - c2*a**2 - c3*a**3)
+
+def rg_solve(a0, t0, t1, nf, step):
+    """ RK4 solution of the RG equation from t0 = ln(mu0^2) to t1 on a
+        uniform grid. Returns the grid and a on it """
+    t = np.linspace(t0, t1, max(int(np.ceil(abs(t1 - t0) / step)), 1) + 1)
+    h = t[1] - t[0]
+    a = np.empty(t.size)
+    a[0] = a0
+    for i in range(t.size - 1):
+        k1 = rg_beta(a[i], nf)
+        k2 = rg_beta(a[i] + 0.5*h*k1, nf)
+        k3 = rg_beta(a[i] + 0.5*h*k2, nf)
+        k4 = rg_beta(a[i] + h*k3, nf)
+        a[i+1] = a[i] + h * (k1 + 2*k2 + 2*k3 + k4) / 6
+    return t, a
+
+@functools.lru_cache(maxsize=8)
+def rg_table(asmz=ASMZ, mulo=1., muhi=1000., step=1.e-3):
+    """ alpha_s / pi on a dense ln(mu^2) grid, one segment per number of
+        active flavours: [(nf, t, a), ...] ordered in mu """
+    tmz = np.log(MZ**2)
+    tc, tb, tt = np.log([MC**2, MB**2, MT**2])
+    t5lo, a5lo = rg_solve(asmz / np.pi, tmz, tb, 5, step)
+    t4, a4 = rg_solve(decouple_down(a5lo[-1], 4), tb, tc, 4, step)
+    t3, a3 = rg_solve(decouple_down(a4[-1], 3), tc, np.log(mulo**2), 3, step)
+    t5hi, a5hi = rg_solve(asmz / np.pi, tmz, tt, 5, step)
+    t6, a6 = rg_solve(decouple_up(a5hi[-1], 5), tt, np.log(muhi**2), 6, step)
+    return [
+        (3, t3[::-1], a3[::-1]),
+        (4, t4[::-1], a4[::-1]),
+        (5, np.concatenate([t5lo[:0:-1], t5hi]), np.concatenate([a5lo[:0:-1], a5hi])),
+        (6, t6, a6),
+    ]
+
+def alpha_s_over_pi_rg(s, asmz=ASMZ):
+    """ alpha_s / pi at mu^2 = s from the tabulated RG solution with
+        threshold decoupling. Cubic Hermite interpolation using the beta
+        function as derivative, nan outside of the table """
+    t = np.log(np.asarray(s, dtype=float))
+    segments = rg_table(asmz)
+    bounds = [seg_t[-1] for _, seg_t, _ in segments[:-1]]
+    iseg = np.searchsorted(bounds, t, side='right')
+    result = np.full(t.shape, np.nan)
+    for idx, (nf, seg_t, seg_a) in enumerate(segments):
+        mask = (iseg == idx) & (t >= seg_t[0]) & (t <= seg_t[-1])
+        # the 5-flavour segment joins two grids with different steps at MZ
+        knot = np.clip(np.searchsorted(seg_t, t[mask], side='right') - 1, 0, seg_t.size - 2)
+        h = seg_t[knot+1] - seg_t[knot]
+        u = (t[mask] - seg_t[knot]) / h
+        a0, a1 = seg_a[knot], seg_a[knot+1]
+        d0, d1 = h * rg_beta(a0, nf), h * rg_beta(a1, nf)
+        result[mask] = (2*u**3 - 3*u**2 + 1)*a0 + (u**3 - 2*u**2 + u)*d0 +\
+            (-2*u**3 + 3*u**2)*a1 + (u**3 - u**2)*d1
+    return result[()] if result.ndim == 0 else result
@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+
+""" Energy-binned world average of R over all experiments
+
+    Points are weighted with w = 1/dR^2 (mean of dRp and dRn). Per bin
+    the average is sum(w R)/sum(w), its point-to-point uncertainty
+    sqrt(sum(w^2 d))/sum(w) with d the stat and syst variance, and every
+    corr component of an experiment contributes the fully correlated
+    normalization term sum(w c)/sum(w) to all bins it populates. The
+    uncertainties are multiplied by the PDG scale factor
+    S = sqrt(chi2/(N - 1)) if it exceeds 1, leaving out of chi2 the
+    points with dR > 3 sqrt(N) times the uncertainty of the average.
+
+    The points are streamed in chunks of at most CHUNK points of one
+    experiment from the memory-mapped store and reduced per bin with sort
+    and reduceat, memory grows with the number of bins and normalization
+    terms only.
+"""
+
+import numpy as np
+
+import ragged
+import rtrace
+from loaddata import DATAPATH, map_store, store_metas, select_experiments
+from covariance import LowRankCov, widen
+
+# Points per chunk of an experiment
+CHUNK = 1 << 16
+
+def iter_chunks(arrays, selected=None, chunk=CHUNK):
+    """ Yields (experiment index, dict of E, R, w, d, corr (n, m) arrays)
+        per chunk of at most chunk points of an experiment """
+    offsets = arrays['offsets']
+    for idx in range(offsets.size - 1) if selected is None else selected:
+        for first in range(offsets[idx], offsets[idx+1], chunk):
+            pos = np.arange(first, min(first + chunk, offsets[idx+1]))
+            yield idx, chunk_arrays(arrays, pos)
+
+def chunk_arrays(arrays, pos):
+    dR = 0.5 * (arrays['dRp'][pos] + arrays['dRn'][pos])
+    syst = [ragged.to_padded(arrays[f'syst{s}_val'], arrays[f'syst{s}_off'], pos)[0]
+            for s in 'pn']
+    corr = [ragged.to_padded(arrays[f'corr{s}_val'], arrays[f'corr{s}_off'], pos)[0]
+            for s in 'pn']
+    width = max(c.shape[1] for c in corr)
+    corr = 0.5 * sum(widen(c, width) for c in corr)
+    stat = 0.5 * (arrays['statp'][pos] + arrays['statn'][pos])
+    return {
+        'E': arrays['E'][pos], 'R': arrays['R'][pos], 'dR': dR, 'w': 1 / dR**2,
+        'd': stat**2 + (0.5 * sum(np.sqrt(np.sum(s**2, axis=1)) for s in syst))**2,
+        'corr': corr,
+    }
+
+def bin_reduce(bins, values):
+    """ Unique bins and per-bin sums of the columns of values (n, k) """
+    order = np.argsort(bins, kind='stable')
+    bins, values = bins[order], values[order]
+    starts = np.flatnonzero(np.r_[True, bins[1:] != bins[:-1]])
+    return bins[starts], np.add.reduceat(values, starts, axis=0)
+
+def in_bins(edges, E):
+    bins = np.searchsorted(edges, E, side='right') - 1
+    return bins, (bins >= 0) & (bins < edges.size - 1)
+
+def world_average(edges, datapath=DATAPATH, pdgcut=True, **predicates):
+    """ (DataFrame with lo, hi, E, R, dRstat, dRnorm, dR, scale, npoints
+        per bin, LowRankCov of the binned R). predicates are those of
+        loaddata.select_experiments """
+    import pandas as pd
+
+    edges = np.asarray(edges, dtype=float)
+    nbins = edges.size - 1
+    arrays = map_store(datapath)
+    selected = select_experiments(store_metas(arrays), **predicates)
+    # sum of w, w E, w R, w^2 d, w R^2 and number of points per bin
+    sums = np.zeros((nbins, 6))
+    # per experiment sum of w c per bin and corr component
+    norms = {}
+    with rtrace.span('average', bins=nbins, experiments=len(selected)):
+        for idx, exp in iter_chunks(arrays, selected):
+            bins, mask = in_bins(edges, exp['E'])
+            if not mask.any():
+                continue
+            w = exp['w'][mask]
+            cols = np.column_stack([w, w * exp['E'][mask], w * exp['R'][mask],
+                                    w**2 * exp['d'][mask], w * exp['R'][mask]**2, np.ones(w.size)])
+            ubins, binsums = bin_reduce(bins[mask], cols)
+            sums[ubins] += binsums
+            ubins, wcsums = bin_reduce(bins[mask], w[:, None] * exp['corr'][mask])
+            norm = norms.get(idx, np.zeros((nbins, 0)))
+            width = max(norm.shape[1], wcsums.shape[1])
+            norms[idx] = norm = widen(norm, width)
+            norm[ubins] += widen(wcsums, width)
+
+    sw = sums[:, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        R = sums[:, 2] / sw
+        dRstat = np.sqrt(sums[:, 3]) / sw
+        # one normalization column per corr component of an experiment
+        U = np.hstack([np.zeros((nbins, 0))] + [norm[:, np.any(norm != 0, axis=0)]
+                                                for norm in norms.values()])
+        U = np.divide(U, sw[:, None], out=np.zeros_like(U), where=sw[:, None] > 0)
+        dRnorm = np.sqrt(np.sum(U**2, axis=1))
+        dR = np.sqrt(dRstat**2 + dRnorm**2)
+        npoints = sums[:, 5].astype(int)
+
+        if pdgcut:
+            chi2, ncut = pdg_chi2(arrays, selected, edges, R, dR, npoints)
+        else:
+            chi2, ncut = sums[:, 4] - sums[:, 2]**2 / sw, npoints
+        scale = np.where(ncut > 1, np.sqrt(np.clip(chi2, 0, None) / (ncut - 1)), np.nan)
+    factor = np.where(scale > 1, scale, 1.)
+
+    df = pd.DataFrame({
+        'lo': edges[:-1], 'hi': edges[1:], 'E': sums[:, 1] / np.where(sw > 0, sw, np.nan),
+        'R': R, 'dRstat': factor * dRstat, 'dRnorm': factor * dRnorm, 'dR': factor * dR,
+        'scale': scale, 'npoints': npoints,
+    })
+    filled = sw > 0
+    cov = LowRankCov((factor * dRstat)[filled]**2, (factor[:, None] * U)[filled]) \
+        if filled.any() else LowRankCov(np.zeros(0), np.zeros((0, 0)))
+    return df, cov
+
+def pdg_chi2(arrays, selected, edges, R, dR, npoints):
+    """ Second streaming pass: chi2 per bin and number of points, leaving
+        out the points with dR > 3 sqrt(N) dR of the average """
+    nbins = edges.size - 1
+    sums = np.zeros((nbins, 2))
+    cut = 3 * np.sqrt(npoints) * dR
+    for _, exp in iter_chunks(arrays, selected):
+        bins, mask = in_bins(edges, exp['E'])
+        mask[mask] &= exp['dR'][mask] <= cut[bins[mask]]
+        if not mask.any():
+            continue
+        b = bins[mask]
+        cols = np.column_stack([exp['w'][mask] * (exp['R'][mask] - R[b])**2, np.ones(b.size)])
+        ubins, binsums = bin_reduce(b, cols)
+        sums[ubins] += binsums
+    return sums[:, 0], sums[:, 1]
+
+def main():
+    import pandas as pd
+
+    df, _ = world_average(np.arange(2, 7.01, 0.25))
+    with pd.option_context('display.float_format', '{:.4f}'.format):
+        print(df.to_string(index=False))
+
+if __name__ == '__main__':
+    main()
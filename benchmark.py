@@ -0,0 +1,164 @@
+#! /usr/bin/env python
+
+""" Benchmarks of every pipeline stage on synthetic scaled datasets
+
+    write_synthetic creates experiments in the data/*.json schema with
+    scale times the points of every real experiment. run_benchmarks
+    reports the wall time and the peak traced memory of each stage as
+    JSON records that can be compared across commits with --compare.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import subprocess
+import contextlib
+import numpy as np
+
+import loaddata
+from datafilter import rfilter
+
+SCALES = [1, 10, 100, 1000]
+WORKDIR = '/tmp/rplot-bench'
+
+def write_synthetic(odir, scale=1, seed=1, datapath=loaddata.DATAPATH):
+    """ Every real experiment with its points repeated scale times, the
+        copies spread in energy over the mean point spacing and smeared
+        by 1% in R """
+    rng = np.random.default_rng(seed)
+    os.makedirs(odir, exist_ok=True)
+    for path in loaddata.get_jsons(datapath=datapath):
+        with open(path, 'r') as ifile:
+            data = json.load(ifile)
+        points = data['data']
+        E = np.array([item['E'] for item in points])
+        spacing = np.ptp(E) / len(points) if len(points) > 1 else 1.e-3 * E[0]
+        idx = np.repeat(np.arange(len(points)), scale)
+        Enew = E[idx]
+        if scale > 1:
+            Enew = Enew + spacing * rng.uniform(-0.5, 0.5, idx.size)
+        order = np.argsort(Enew, kind='stable')
+        Rscale = 1 + (0.01 * rng.standard_normal(idx.size) if scale > 1 else np.zeros(idx.size))
+        data['data'] = [
+            dict(points[i], E=round(float(Enew[j]), 6), R=round(float(points[i]['R'] * Rscale[j]), 6))
+            for i, j in zip(idx[order], order)]
+        with open(os.path.join(odir, os.path.basename(path)), 'w') as ofile:
+            json.dump(data, ofile)
+
+def measure(func):
+    """ Wall time of a plain run and peak traced memory of a second run """
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+def stages(datapath, scale, seed=1):
+    """ (stage name, callable) pairs on the synthetic data at datapath """
+    from rpredict import rew, rewqcd
+    from tauxsec import tau_xsec
+    from rplot import psi_lineshape
+
+    cachepath = os.path.join(datapath, loaddata.CACHENAME)
+    def load_cold():
+        if os.path.exists(cachepath):
+            os.remove(cachepath)
+        loaddata.load_store(datapath)
+
+    arrays = loaddata.load_store(datapath)
+    index = loaddata.energy_index(arrays)
+    windows = np.sort(np.random.default_rng(seed).uniform(2, 7, (100, 2)), axis=1)
+    def range_query():
+        for lo, hi in windows:
+            for idx, pos in loaddata.positions_in_range(arrays, index, lo, hi).items():
+                loaddata.store_to_df(arrays, pos, arrays['offsets'][idx])
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        data = loaddata.measurements_in_range(2, 7, datapath=datapath)
+        filtered = [(meta, rfilter(df)) for meta, df in data]
+    def render():
+        from matplotlib.figure import Figure
+        from rplot import rplot
+        fig = Figure(figsize=(18, 8))
+        rplot(fig.subplots(), filtered, deltaE=None)
+        fig.savefig(io.BytesIO(), format='png')
+
+    sqrts = np.linspace(2, 7, 1000 * scale)
+    return [
+        ('load_cold', load_cold),
+        ('load_warm', lambda: loaddata.load_store(datapath)),
+        ('index', lambda: loaddata.energy_index(arrays)),
+        ('range_query', range_query),
+        ('filter', lambda: [rfilter(df) for _, df in data]),
+        ('rew', lambda: rew(sqrts**2)),
+        ('rewqcd', lambda: rewqcd(sqrts**2)),
+        ('tau_xsec', lambda: tau_xsec(sqrts)),
+        ('psi_lineshape', lambda: psi_lineshape(sqrts)),
+        ('render', render),
+    ]
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scales=SCALES, workdir=WORKDIR, only=None):
+    """ Yields one record per (scale, stage) """
+    commit = git_commit()
+    for scale in scales:
+        datapath = os.path.join(workdir, f'x{scale}')
+        write_synthetic(datapath, scale)
+        npoints = loaddata.load_store(datapath)['E'].size
+        for stage, func in stages(datapath, scale):
+            if only and stage not in only:
+                continue
+            elapsed, peak = measure(func)
+            yield {'commit': commit, 'scale': scale, 'points': npoints, 'stage': stage,
+                   'time': elapsed, 'peak_mb': peak}
+
+def compare(old, new):
+    """ Prints the time ratio new / old per (scale, stage) """
+    base = {(rec['scale'], rec['stage']): rec for rec in old}
+    for rec in new:
+        ref = base.get((rec['scale'], rec['stage']))
+        if ref is not None:
+            print(f'{rec["stage"]:>14s} x{rec["scale"]:<5d} {ref["time"]:9.4f} s -> '
+                  f'{rec["time"]:9.4f} s ({rec["time"] / ref["time"]:5.2f}) '
+                  f'{ref["peak_mb"]:8.1f} MB -> {rec["peak_mb"]:8.1f} MB')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--stages', nargs='+', default=None)
+    parser.add_argument('--workdir', default=WORKDIR)
+    parser.add_argument('--output', default=None, help='JSON report file')
+    parser.add_argument('--compare', default=None, help='JSON report to compare with')
+    args = parser.parse_args()
+
+    records = []
+    for rec in run_benchmarks(args.scales, args.workdir, args.stages):
+        print(f'{rec["stage"]:>14s} x{rec["scale"]:<5d} {rec["points"]:8d} points '
+              f'{rec["time"]:9.4f} s {rec["peak_mb"]:8.1f} MB', file=sys.stderr)
+        records.append(rec)
+    report = json.dumps(records, indent=1)
+    if args.output:
+        with open(args.output, 'w') as ofile:
+            ofile.write(report)
+    else:
+        print(report)
+    if args.compare:
+        with open(args.compare, 'r') as ifile:
+            compare(json.load(ifile), records)
+
+if __name__ == '__main__':
+    main()
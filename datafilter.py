@@ -1,92 +1,275 @@
+import os
+import pickle
+import hashlib
+import threading
 import numpy as np
-import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import ragged
+import rtrace
+
+# Columns recomputed on merge, the rest is taken from the first record
+MERGECOLS = ['E', 'dEp', 'dEn', 'R', 'dRp', 'dRn', 'statp', 'statn']
+# Uncertainty components, a merged record keeps only their quadrature sum
+# as a single component
+QSUMCOLS = ['systp', 'systn', 'corrp', 'corrn']
+# Points to filter above which filter_many uses a process pool
+PARALLEL_ROWS = 20000
 
 def oplus(*args):
     return np.sqrt(sum(x**2 for x in args))
 
 def joint_same(r1, r2):
-    rjoin = r1.copy()
-    rjoin.R = (r1.R * r2.statp**2 + r2.R * r1.statp**2) /\
-        (r1.statp**2 + r2.statp**2)
-    rjoin.systp = [min(oplus(*r1.systp), oplus(*r2.systp))]
-    rjoin.systn = [min(oplus(*r1.systn), oplus(*r2.systn))]
-    rjoin.corrp = [min(oplus(*r1.corrp), oplus(*r2.corrp))]
-    rjoin.corrn = [min(oplus(*r1.corrn), oplus(*r2.corrn))]
-    rjoin.statp = 1. / oplus(1. / r1.statp, 1. / r2.statp)
-    rjoin.statn = 1. / oplus(1. / r1.statn, 1. / r2.statn)
-    rjoin.dRp = oplus(rjoin.statp, *rjoin.systp, *rjoin.corrp)
-    rjoin.dRn = oplus(rjoin.statn, *rjoin.systn, *rjoin.corrn)
+    """ Error-weighted merge of records at the same energy """
+    rjoin = {}
+    rjoin['R'] = (r1['R'] * r2['statp']**2 + r2['R'] * r1['statp']**2) /\
+        (r1['statp']**2 + r2['statp']**2)
+    for key in ['E', 'dEp', 'dEn']:
+        rjoin[key] = r1[key]
+    for key in QSUMCOLS:
+        rjoin[key] = np.minimum(r1[key], r2[key])
+    rjoin['statp'] = 1. / oplus(1. / r1['statp'], 1. / r2['statp'])
+    rjoin['statn'] = 1. / oplus(1. / r1['statn'], 1. / r2['statn'])
     return rjoin
 
 def join_records(r1, r2):
-    if r1.E == r2.E:
-        return joint_same(r1, r2)
-    
-    elo = r1.E - r1.dEn
-    ehi = r2.E + r2.dEp
+    """ Width-weighted merge of records at different energies """
+    elo = r1['E'] - r1['dEn']
+    ehi = r2['E'] + r2['dEp']
     emi = 0.5 * (ehi + elo)
     de  = 0.5 * np.abs(ehi - elo)
 
-    if r1.dEp + r1.dEn > 1.e-7 and r2.dEp + r2.dEn > 1.e-7:
-        d1 = r1.dEp + r1.dEn
-        d2 = r2.dEp + r2.dEn
-    else:
-        d1 = emi - elo
-        d2 = ehi - emi
-
+    wide = (r1['dEp'] + r1['dEn'] > 1.e-7) & (r2['dEp'] + r2['dEn'] > 1.e-7)
+    d1 = np.where(wide, r1['dEp'] + r1['dEn'], emi - elo)
+    d2 = np.where(wide, r2['dEp'] + r2['dEn'], ehi - emi)
     d = d1 + d2
 
-    rjoin = r1.copy()
-    rjoin.R = (d1*r1.R + d2*r2.R) / d
-    rjoin.E, rjoin.dEp, rjoin.dEn = emi, de, de
-    rjoin.statp = oplus(d1*r1.statp, d2*r2.statp) / d
-    rjoin.statn = oplus(d1*r1.statn, d2*r2.statn) / d
-    rjoin.systp = [max(oplus(*r1.systp), oplus(*r2.systp))]
-    rjoin.systn = [max(oplus(*r1.systn), oplus(*r2.systn))]
-    rjoin.corrp = [max(oplus(*r1.corrp), oplus(*r2.corrp))]
-    rjoin.corrn = [max(oplus(*r1.corrn), oplus(*r2.corrn))]
-    rjoin.dRp = oplus(rjoin.statp, *rjoin.systp, *rjoin.corrp)
-    rjoin.dRn = oplus(rjoin.statn, *rjoin.systn, *rjoin.corrn)
+    rjoin = {}
+    rjoin['R'] = (d1*r1['R'] + d2*r2['R']) / d
+    rjoin['E'], rjoin['dEp'], rjoin['dEn'] = emi, de, de
+    rjoin['statp'] = oplus(d1*r1['statp'], d2*r2['statp']) / d
+    rjoin['statn'] = oplus(d1*r1['statn'], d2*r2['statn']) / d
+    for key in QSUMCOLS:
+        rjoin[key] = np.maximum(r1[key], r2[key])
     return rjoin
 
-def compare_items(it1, it2, olist, deltaE, deltaSigma):
-    if it2.E - it1.E < deltaE and\
-        (it2.R - it1.R) / oplus(it2.statp, it1.statp) < deltaSigma:
-        olist.append(join_records(it1, it2))
-    else:
-        olist.append(it1)
-        olist.append(it2)
+def merge_pass(cols, first, deltaE, deltaSigma):
+    """ Merges the pairs (first, first+1) of compatible records """
+    second = first + 1
+    E, R, statp = cols['E'], cols['R'], cols['statp']
+    mask = (E[second] - E[first] < deltaE) &\
+        ((R[second] - R[first]) / oplus(statp[second], statp[first]) < deltaSigma)
+    first, second = first[mask], second[mask]
+    if not first.size:
+        return cols
+
+    ocols = {key: val.copy() for key, val in cols.items()}
+    same = E[first] == E[second]
+    for merge, sel in [(joint_same, same), (join_records, ~same)]:
+        idx = first[sel]
+        r1 = {key: val[idx] for key, val in cols.items()}
+        r2 = {key: val[second[sel]] for key, val in cols.items()}
+        rjoin = merge(r1, r2)
+        rjoin['dRp'] = oplus(rjoin['statp'], rjoin['systp'], rjoin['corrp'])
+        rjoin['dRn'] = oplus(rjoin['statn'], rjoin['systn'], rjoin['corrn'])
+        rjoin['merged'] = True
+        for key, val in rjoin.items():
+            ocols[key][idx] = val
+
+    return {key: np.delete(val, second) for key, val in ocols.items()}
 
 def rfilter(data, deltaE=0.01, deltaSigma=2):
-    new_entries = []
-    for i in range(0, data.shape[0]-1, 2):
-        compare_items(data.iloc[i], data.iloc[i+1], new_entries, deltaE, deltaSigma)
-    if data.shape[0] % 2:
-        new_entries.append(data.iloc[-1])
-    odata = pd.DataFrame(new_entries)
-
-    new_entries = [odata.iloc[0]]
-    for i in range(1, odata.shape[0]-1, 2):
-        compare_items(odata.iloc[i], odata.iloc[i+1], new_entries, deltaE, deltaSigma)
-    if not odata.shape[0] % 2:
-        new_entries.append(odata.iloc[-1])
-    odata = pd.DataFrame(new_entries)
-
-    print(f'filter iteration {data.shape} -> {odata.shape}')
-    if odata.shape != data.shape:
-        return rfilter(odata, deltaE)
+    """ Merges neighbouring records closer than deltaE in energy and
+        deltaSigma in R until nothing changes """
+    import pandas as pd
 
+    cols = {key: data[key].to_numpy(dtype=float) for key in MERGECOLS}
+    for key in QSUMCOLS:
+        cols[key] = ragged.qsum(data, key)
+    cols['merged'] = np.zeros(data.shape[0], dtype=bool)
+    cols['row'] = np.arange(data.shape[0])
+
+    with rtrace.span('filter', rows_in=data.shape[0], iterations=0) as args:
+        while True:
+            size = cols['E'].size
+            cols = merge_pass(cols, np.arange(0, size - 1, 2), deltaE, deltaSigma)
+            cols = merge_pass(cols, np.arange(1, cols['E'].size - 1, 2), deltaE, deltaSigma)
+            args['iterations'] += 1
+            if cols['E'].size == size:
+                break
+        args['rows_out'] = cols['E'].size
+        args['merges'] = data.shape[0] - cols['E'].size
+    rtrace.count('filter.iterations', args['iterations'])
+    rtrace.count('filter.merges', args['merges'])
+
+    row, merged = cols['row'], cols['merged']
+    odata = pd.DataFrame(index=data.index[row])
+    for key in data.columns:
+        odata[key] = cols[key] if key in MERGECOLS else data[key].to_numpy()[row]
+    if merged.any():
+        for key in QSUMCOLS:
+            values = ragged.padded(odata, key)
+            values = np.pad(values, ((0, 0), (0, max(1 - values.shape[1], 0))))
+            values[merged] = 0
+            values[merged, 0] = cols[key][merged]
+            counts = np.where(merged, 1, odata[f'n{key}'])
+            ragged.set_padded(odata, key, values, counts)
     return odata
 
+class FilterCache:
+    """ Bounded LRU of rfilter results keyed on a hash of the input points
+        and the merge parameters, optionally backed by at most maxdisk
+        pickles in cachedir, the least recently used (mtime) are evicted """
+    def __init__(self, maxsize=256, cachedir=None, maxdisk=1024):
+        self.maxsize = maxsize
+        self.cachedir = cachedir
+        self.maxdisk = maxdisk
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    @staticmethod
+    def key(data, deltaE, deltaSigma):
+        import pandas as pd
+
+        sha = hashlib.sha1(pd.util.hash_pandas_object(data).to_numpy().tobytes())
+        sha.update(repr((list(data.columns), deltaE, deltaSigma)).encode())
+        return sha.hexdigest()
+
+    def load(self, key):
+        path = os.path.join(self.cachedir, f'{key}.pkl')
+        try:
+            with open(path, 'rb') as ifile:
+                odata = pickle.load(ifile)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return odata
+
+    def store(self, key, odata):
+        os.makedirs(self.cachedir, exist_ok=True)
+        path = os.path.join(self.cachedir, f'{key}.pkl')
+        with open(f'{path}.{os.getpid()}.tmp', 'wb') as ofile:
+            pickle.dump(odata, ofile)
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+        self.evict()
+
+    def evict(self):
+        """ Removes the least recently used pickles beyond maxdisk """
+        entries = []
+        for entry in os.scandir(self.cachedir):
+            if entry.name.endswith('.pkl'):
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass
+        for _, path in sorted(entries)[:max(len(entries) - self.maxdisk, 0)]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            rtrace.count('filter.cache_evictions')
+
+    def lookup(self, key):
+        """ Cached result or None, looked up in memory, then on disk """
+        with self.lock:
+            odata = self.cache.get(key)
+            if odata is not None:
+                self.cache.move_to_end(key)
+                self.hits += 1
+                rtrace.count('filter.cache_hits')
+                return odata
+        odata = self.load(key) if self.cachedir else None
+        with self.lock:
+            if odata is not None:
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        if odata is not None:
+            rtrace.count('filter.cache_disk_hits')
+            self.insert(key, odata, disk=False)
+        else:
+            rtrace.count('filter.cache_misses')
+        return odata
+
+    def insert(self, key, odata, disk=True):
+        if disk and self.cachedir:
+            self.store(key, odata)
+        with self.lock:
+            self.cache[key] = odata
+            while len(self.cache) > self.maxsize:
+                self.cache.popitem(last=False)
+
+    def rfilter(self, data, deltaE=0.01, deltaSigma=2):
+        """ Copy of the cached result, computed on a miss """
+        key = self.key(data, deltaE, deltaSigma)
+        odata = self.lookup(key)
+        if odata is None:
+            odata = rfilter(data, deltaE, deltaSigma)
+            self.insert(key, odata)
+        return odata.copy()
+
+    def stats(self):
+        return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                'size': len(self.cache)}
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+# RFILTER_CACHE=<directory> adds a disk cache shared between processes
+filter_cache = FilterCache(cachedir=os.environ.get('RFILTER_CACHE'))
+
+def cached_rfilter(data, deltaE=0.01, deltaSigma=2):
+    """ rfilter memoized in filter_cache """
+    return filter_cache.rfilter(data, deltaE, deltaSigma)
+
+def filter_many(frames, deltaE=0.01, deltaSigma=2, workers=None, cache=filter_cache):
+    """ cached_rfilter of every frame. Above PARALLEL_ROWS missing points
+        the misses are filtered in a process pool, largest frames first """
+    keys = [cache.key(df, deltaE, deltaSigma) for df in frames]
+    out = [cache.lookup(key) for key in keys]
+    todo = sorted((idx for idx, odata in enumerate(out) if odata is None),
+                  key=lambda idx: -frames[idx].shape[0])
+    if workers != 1 and len(todo) > 1 and\
+            sum(frames[idx].shape[0] for idx in todo) >= PARALLEL_ROWS:
+        with rtrace.span('filter.pool', frames=len(todo)):
+            with ProcessPoolExecutor(workers) as pool:
+                futures = [pool.submit(rfilter, frames[idx], deltaE, deltaSigma) for idx in todo]
+                results = [future.result() for future in futures]
+    else:
+        results = [rfilter(frames[idx], deltaE, deltaSigma) for idx in todo]
+    for idx, odata in zip(todo, results):
+        cache.insert(keys[idx], odata)
+        out[idx] = odata
+    return [odata.copy() for odata in out]
+
+def decimate(data, lo, hi, nbins):
+    """ Level of detail reduction: splits [lo, hi] into nbins energy
+        buckets and keeps per bucket only the points with the lowest and
+        highest R and with the lowest and highest error bar end. An empty
+        range, e.g. autoscaled to a single energy, keeps all points """
+    E = data.E.to_numpy()
+    if not E.size or not hi > lo:
+        return data
+    bucket = np.clip(((E - lo) / (hi - lo) * nbins).astype(int), 0, nbins - 1)
+    R = data.R.to_numpy()
+    keep = np.zeros(E.size, dtype=bool)
+    for values in [R, -R, R - data.dRn.to_numpy(), -R - data.dRp.to_numpy()]:
+        order = np.lexsort((values, bucket))
+        first = np.r_[True, bucket[order][1:] != bucket[order][:-1]]
+        keep[order[first]] = True
+    return data[keep]
+
 def main():
-    from readpdg import dat_to_df
-
-    df = dat_to_df()
-    # df = df[df.code == 'OSTERHELD 86']
-    df = df[df.code == 'EDWARDS 90']
-    print(df.head(11))
-    fdf = rfilter(df, 0.01, 3)
-    print(fdf.head(11))
+    from loaddata import measurements_in_range
+
+    for meta, df in measurements_in_range(2, 7):
+        if meta.code in ['Osterheld 86', 'Edwards 90']:
+            print(df.head(11))
+            fdf = rfilter(df, 0.01, 3)
+            print(fdf.head(11))
 
 if __name__ == '__main__':
     main()
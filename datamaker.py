@@ -1,13 +1,34 @@
 #! /usr/bin/env python
 
+""" Builds the data/*.json files from the PDG table and the hand-entered
+    tables of handtables.py
+
+    The build is incremental: data/.datamaker.manifest records a hash of the
+    inputs of every output (PDG records of the code, bibinfo entry or
+    hand table, and the builder sources) and only stale or missing
+    outputs are rewritten.
+"""
+
 import os
+import sys
 import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
+import ragged
 from datafilter import oplus
 from bibinfo import metainfo
-from readpdg import dat_to_df
+from readpdg import DATFILE, dat_to_df
+from handtables import TABLES
 
 DATAPATH = './data'
+# Not a .json so that loaddata does not take it for a data file
+MANIFEST = '.datamaker.manifest'
+# Modules whose code determines the content of the outputs, handtables.py
+# is data and enters through the output dicts
+SOURCES = ['datamaker.py', 'readpdg.py', 'ragged.py', 'datafilter.py']
+
 def flf(x, decimals=4):
     """ Format floats and list of floats """
     if isinstance(x, float):
@@ -16,11 +37,10 @@ def flf(x, decimals=4):
         return list(map(flf, x))
     return x
 
-def df_to_json(df, code, ofname):
-    meta = metainfo.get(code, None)
-    if meta is None:
-        print(f'No meta info for {code}')
-        return
+def pdg_odict(df, meta):
+    """ Output dict of the PDG records of one code """
+    dRp = oplus(df.statp, df.norm, ragged.qsum(df, 'systp'))
+    dRn = oplus(df.statn, df.norm, ragged.qsum(df, 'systn'))
     odict = {
         'meta': meta,
         'data': [
@@ -29,267 +49,134 @@ def df_to_json(df, code, ofname):
                 'dEp': item.EcmHi - item.Ecm,
                 'dEn': item.Ecm - item.EcmLo,
                 'R': item.R,
-                'dRp': flf(oplus(item.statp, item.norm, *item.systp)),
-                'dRn': flf(oplus(item.statn, item.norm, *item.systn)),
+                'dRp': flf(errp),
+                'dRn': flf(errn),
                 'statp': item.statp,
                 'statn': item.statn,
-                'systp': flf(item.systp),
-                'systn': flf(item.systn),
+                'systp': flf(systp),
+                'systn': flf(systn),
                 'corrp': [flf(item.norm)],
                 'corrn': [flf(item.norm)],
             }
-            for _, item in df.iterrows()]
+            for (_, item), errp, errn, systp, systn in zip(
+                df.iterrows(), dRp.to_numpy(), dRn.to_numpy(),
+                ragged.to_lists(df, 'systp'), ragged.to_lists(df, 'systn'))]
     }
-    with open(os.path.join(DATAPATH, ofname), 'w') as ofile:
+    return odict
+
+def pdg_ofname(code):
+    return f'{code.replace(" ", "_")}.json'
+
+def input_key(*items):
+    """ Hash of json-serializable build inputs """
+    return hashlib.sha1(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()
+
+def file_hash(*paths):
+    sha = hashlib.sha1()
+    for path in paths:
+        with open(path, 'rb') as ifile:
+            sha.update(ifile.read())
+    return sha.hexdigest()
+
+def code_version():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return file_hash(*(os.path.join(here, name) for name in SOURCES))
+
+def read_manifest(datapath=DATAPATH):
+    path = os.path.join(datapath, MANIFEST)
+    if not os.path.exists(path):
+        return {'outputs': {}, 'pdg': {}}
+    with open(path, 'r') as ifile:
+        return json.load(ifile)
+
+def write_manifest(manifest, datapath=DATAPATH):
+    tmppath = os.path.join(datapath, f'{MANIFEST}.tmp')
+    with open(tmppath, 'w') as ofile:
+        json.dump(manifest, ofile, indent=4, sort_keys=True)
+    os.replace(tmppath, os.path.join(datapath, MANIFEST))
+
+def write_json(odict, path):
+    with open(path, 'w') as ofile:
         json.dump(odict, ofile, indent=4)
-
-
-def process_pdg(lo=0, hi=10000, codes=[]):
-    df = dat_to_df(lo=lo, hi=hi)
-    for code, data in df.groupby('code'):
-        if codes and code not in codes:
-            print(f'skipping {code}')
+    return path
+
+def pdg_jobs(datfile, code, lo, hi):
+    """ ([(ofname, key, odict builder) per PDG code], codes that have no
+        bibinfo entry) """
+    import pandas as pd
+
+    jobs, missing = [], []
+    for pdgcode, data in dat_to_df(datfile, lo, hi).groupby('code'):
+        meta = metainfo.get(pdgcode)
+        if meta is None:
+            missing.append(pdgcode)
+            continue
+        rows = hashlib.sha1(pd.util.hash_pandas_object(data, index=False).to_numpy()).hexdigest()
+        builder = lambda data=data, meta=meta: pdg_odict(data, meta)
+        jobs.append((pdg_ofname(pdgcode), input_key(code, meta, rows), builder))
+    return jobs, missing
+
+def build(datapath=DATAPATH, datfile=DATFILE, lo=0, hi=10000, force=False, workers=None):
+    """ Rewrites the stale outputs. Returns {'rebuilt': [...], 'current': [...],
+        'missing': [codes without bibinfo entry]} """
+    manifest = read_manifest(datapath)
+    outputs = manifest['outputs']
+    code = code_version()
+    current = lambda ofname, key: not force and outputs.get(ofname) == key and\
+        os.path.exists(os.path.join(datapath, ofname))
+
+    jobs, report = [], {'rebuilt': [], 'current': [], 'missing': []}
+    for ofname, table in TABLES.items():
+        odict = table()
+        key = input_key(code, odict)
+        if current(ofname, key):
+            report['current'].append(ofname)
         else:
-            ofname = f'{code.replace(" ", "_")}.json'
-            print(f'{code}: {ofname}')
-            df_to_json(data, code, ofname)
-
-
-def anashin19(code='Anashin 19', ofname='anashin19.json'):
-    data = [
-        #  E      dE    R     stat   syst
-        [3.0767, 0.0002, 2.188, 0.056, 0.042],
-        [3.1196, 0.0004, 2.235, 0.042, 0.049],
-        [3.2225, 0.0008, 2.195, 0.040, 0.035],
-        [3.3147, 0.0006, 2.219, 0.035, 0.035],
-        [3.4183, 0.0003, 2.185, 0.032, 0.035],
-        [3.4996, 0.0004, 2.224, 0.054, 0.040],
-        [3.5208, 0.0004, 2.201, 0.050, 0.044],
-        [3.6182, 0.0010, 2.218, 0.038, 0.035],
-        [3.7194, 0.0007, 2.228, 0.039, 0.042],
-    ]
-
-    odict = {
-        'meta': {
-            'code': code,
-            'ref': 'Phys. Lett. B 788 (2019) 42',
-            'doi': 'https://doi.org/10.1016/j.physletb.2018.11.012',
-            'experiment': 'KEDR',
-            'year': 2019,
-            'comment': '',
-        },
-        'data': [
-            {
-                'E': E,
-                'dEp': dE,
-                'dEn': dE,
-                'R': R,
-                'dRp': oplus(stat, syst),
-                'dRn': oplus(stat, syst),
-                'statp': stat,
-                'statn': stat,
-                'systp': [syst],
-                'systn': [syst],
-                'corrp': [],
-                'corrn': [],
-            }
-            for E, dE, R, stat, syst in data]
-    }
-    with open(os.path.join(DATAPATH, ofname), 'w') as ofile:
-        json.dump(odict, ofile, indent=4)
-
-
-def besson07(code='Besson 07', ofname='besson07.json'):
-    """ Measurement of the total hadronic cross section in e+e− annihilation below 10.56 GeV
-        D. Besson et al. (CLEO Collaboration)
-        Phys. Rev. D 76, 072008 – Published 19 October 2007
-
-        At each energy we
-        divide the systematic uncertainty into a common uncer-
-        tainty that correlated across all energy points and an un-
-        correlated uncertainty that is independent for each energy
-        point. The decrease of the uncorrelated systematic uncer-
-        tainty with decreasing beam energy is mainly due to the
-        energy dependence of the two-photon interaction back-
-        ground cross section.
-    """
-    data = [
-        #   E      R    stat   common  uncorr
-        [10.538, 3.591, 0.003, 0.067, 0.049],
-        [10.330, 3.491, 0.006, 0.058, 0.055],
-        [ 9.996, 3.497, 0.004, 0.064, 0.043],
-        [ 9.432, 3.510, 0.005, 0.066, 0.037],
-        [ 8.380, 3.576, 0.024, 0.058, 0.025],
-        [ 7.380, 3.550, 0.019, 0.058, 0.020],
-        [ 6.964, 3.597, 0.033, 0.057, 0.020],
-    ]
-
-    odict = {
-        'meta': {
-            'code': code,
-            'ref': 'Phys. Rev. D 76 (2007) 072008',
-            'doi': 'https://doi.org/10.1103/PhysRevD.76.072008',
-            'experiment': 'CLEO',
-            'year': 2007,
-            'comment': '',
-        },
-        'data': [
-            {
-                'E': E, 'dEp': 0, 'dEn': 0, 'R': R,
-                'dRp': oplus(stat, syst, corr),
-                'dRn': oplus(stat, syst, corr),
-                'statp': stat,
-                'statn': stat,
-                'systp': [syst],
-                'systn': [syst],
-                'corrp': [corr],
-                'corrn': [corr],
-            }
-            for E, R, stat, corr, syst in data]
-    }
-    with open(os.path.join(DATAPATH, ofname), 'w') as ofile:
-        json.dump(odict, ofile, indent=4)
-
-
-def ablikim06(code='Ablikim 06', ofname='ablikim06.json'):
-    data = [
-        #  E       R     stat   syst
-        [3.6500, 2.186, 0.035, 0.087],
-        [3.6600, 2.185, 0.105, 0.087],
-        [3.6920, 2.803, 0.092, 0.112],
-        [3.7000, 2.240, 0.079, 0.089],
-        [3.7080, 2.270, 0.083, 0.091],
-        [3.7160, 2.224, 0.086, 0.089],
-        [3.7240, 2.164, 0.086, 0.086],
-        [3.7320, 2.170, 0.086, 0.087],
-        [3.7400, 2.200, 0.099, 0.088],
-        [3.7480, 2.380, 0.106, 0.116],
-        [3.7500, 2.525, 0.085, 0.123],
-        [3.7512, 2.644, 0.090, 0.129],
-        [3.7524, 2.622, 0.095, 0.128],
-        [3.7536, 2.659, 0.093, 0.130],
-        [3.7548, 2.739, 0.093, 0.134],
-        [3.7560, 2.591, 0.090, 0.127],
-        [3.7572, 2.948, 0.107, 0.144],
-        [3.7584, 3.031, 0.108, 0.148],
-        [3.7596, 3.082, 0.102, 0.151],
-        [3.7608, 3.143, 0.089, 0.154],
-        [3.7620, 2.998, 0.110, 0.147],
-        [3.7622, 3.213, 0.114, 0.157],
-        [3.7634, 3.350, 0.122, 0.164],
-        [3.7646, 3.590, 0.126, 0.176],
-        [3.7658, 3.386, 0.119, 0.166],
-        [3.7670, 3.764, 0.130, 0.184],
-        [3.7682, 3.455, 0.124, 0.169],
-        [3.7694, 3.615, 0.125, 0.177],
-        [3.7706, 3.584, 0.123, 0.175],
-        [3.7714, 3.543, 0.139, 0.173],
-        [3.7716, 3.638, 0.146, 0.178],
-        [3.7718, 3.943, 0.133, 0.193],
-        [3.7720, 3.640, 0.134, 0.178],
-        [3.7722, 3.656, 0.143, 0.179],
-        [3.7726, 3.781, 0.145, 0.185],
-        [3.7730, 3.567, 0.120, 0.175],
-        [3.7742, 3.377, 0.113, 0.165],
-        [3.7754, 3.645, 0.125, 0.178],
-        [3.7766, 3.502, 0.119, 0.171],
-        [3.7778, 3.574, 0.121, 0.175],
-        [3.7790, 3.363, 0.117, 0.165],
-        [3.7798, 3.480, 0.136, 0.170],
-        [3.7802, 3.430, 0.125, 0.168],
-        [3.7804, 3.385, 0.137, 0.166],
-        [3.7808, 3.340, 0.129, 0.163],
-        [3.7810, 3.468, 0.138, 0.170],
-        [3.7812, 3.399, 0.130, 0.166],
-        [3.7814, 3.518, 0.124, 0.172],
-        [3.7816, 2.947, 0.137, 0.144],
-        [3.7818, 3.143, 0.125, 0.154],
-        [3.7822, 3.257, 0.124, 0.159],
-        [3.7826, 3.329, 0.115, 0.163],
-        [3.7838, 3.157, 0.114, 0.155],
-        [3.7850, 2.882, 0.107, 0.141],
-        [3.7862, 2.905, 0.105, 0.142],
-        [3.7874, 2.960, 0.111, 0.145],
-        [3.7886, 2.574, 0.097, 0.126],
-        [3.7898, 2.579, 0.099, 0.126],
-        [3.7900, 2.852, 0.106, 0.140],
-        [3.7950, 2.754, 0.101, 0.135],
-        [3.8000, 2.215, 0.091, 0.108],
-        [3.8100, 2.173, 0.092, 0.087],
-        [3.8200, 2.369, 0.109, 0.095],
-        [3.8300, 2.355, 0.101, 0.094],
-        [3.8400, 2.297, 0.104, 0.092],
-        [3.8500, 2.373, 0.115, 0.095],
-        [3.8600, 2.372, 0.105, 0.095],
-        [3.8720, 2.309, 0.117, 0.092],
-    ]
-    
-    odict = {
-        'meta': {
-            'code': code,
-            'ref': 'Phys. Rev. Lett. 97 (2006) 262001',
-            'doi': 'https://doi.org/10.1103/PhysRevLett.97.262001',
-            'experiment': 'BES',
-            'year': 2006,
-            'comment': '',
-        },
-        'data': [
-            {
-                'E': E, 'dEp': 0, 'dEn': 0, 'R': R,
-                'dRp': oplus(stat, syst),
-                'dRn': oplus(stat, syst),
-                'statp': stat,
-                'statn': stat,
-                'systp': [syst],
-                'systn': [syst],
-                'corrp': [],
-                'corrn': [],
-            }
-            for E, R, stat, syst in data]
-    }
-    with open(os.path.join(DATAPATH, ofname), 'w') as ofile:
-        json.dump(odict, ofile, indent=4)
-
-
-def ablikim09(code='Ablikim 09', ofname='ablikim09.json'):
-    data = [
-        # E      R    stat syst
-        [2.60, 2.18, 0.02, 0.08],
-        [3.07, 2.13, 0.02, 0.07],
-        [3.65, 2.14, 0.01, 0.07],
-    ]
-    odict = {
-        'meta': {
-            'code': code,
-            'ref': 'Phys. Lett. B 677 (2009) 239',
-            'doi': 'https://doi.org/10.1016/j.physletb.2009.05.055',
-            'experiment': 'BES',
-            'year': 2009,
-            'comment': '',
-        },
-        'data': [
-            {
-                'E': E, 'dEp': 0, 'dEn': 0, 'R': R,
-                'dRp': oplus(stat, syst),
-                'dRn': oplus(stat, syst),
-                'statp': stat,
-                'statn': stat,
-                'systp': [syst],
-                'systn': [syst],
-                'corrp': [],
-                'corrn': [],
-            }
-            for E, R, stat, syst in data]
-    }
-    with open(os.path.join(DATAPATH, ofname), 'w') as ofile:
-        json.dump(odict, ofile, indent=4)
+            jobs.append((ofname, key, odict))
+
+    pdgkey = input_key(code, file_hash(datfile), metainfo, lo, hi)
+    pdg = manifest['pdg']
+    if pdg.get('key') == pdgkey and all(current(ofname, outputs[ofname]) for ofname in pdg['outputs']):
+        report['current'].extend(pdg['outputs'])
+        report['missing'] = pdg['missing']
+    else:
+        pdgjobs, missing = pdg_jobs(datfile, code, lo, hi)
+        pdg = {'key': pdgkey, 'outputs': [ofname for ofname, _, _ in pdgjobs], 'missing': missing}
+        report['missing'] = missing
+        for ofname, key, builder in pdgjobs:
+            if current(ofname, key):
+                report['current'].append(ofname)
+            else:
+                jobs.append((ofname, key, builder()))
+
+    paths = [os.path.join(datapath, ofname) for ofname, _, _ in jobs]
+    if len(jobs) > 1 and workers != 1:
+        with ProcessPoolExecutor(workers) as pool:
+            list(pool.map(write_json, [odict for _, _, odict in jobs], paths))
+    else:
+        for (_, _, odict), path in zip(jobs, paths):
+            write_json(odict, path)
+
+    outputs.update({ofname: key for ofname, key, _ in jobs})
+    manifest['pdg'] = pdg
+    write_manifest(manifest, datapath)
+    report['rebuilt'] = [ofname for ofname, _, _ in jobs]
+    return report
 
 def main():
-    anashin19()
-    besson07()
-    ablikim06()
-    ablikim09()
-    process_pdg()
+    parser = argparse.ArgumentParser(description='Builds the data/*.json files')
+    parser.add_argument('--datapath', default=DATAPATH)
+    parser.add_argument('--datfile', default=DATFILE)
+    parser.add_argument('--force', action='store_true', help='rebuild all outputs')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    report = build(args.datapath, args.datfile, force=args.force, workers=args.workers)
+    for ofname in report['rebuilt']:
+        print(f'rebuilt {ofname}')
+    print(f'{len(report["rebuilt"])} rebuilt, {len(report["current"])} current')
+    for code in report['missing']:
+        print(f'No meta info for {code}', file=sys.stderr)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,115 @@
+""" Multi-format figure export skipping outputs that are already current
+
+    An output is current if it exists and the key file next to it
+    records the same export key. The key hashes the source data
+    signature, the plot parameters and the sources of the project
+    modules the figure module imports, directly or in functions.
+"""
+
+import os
+import ast
+import json
+import pickle
+import hashlib
+import functools
+from concurrent.futures import ProcessPoolExecutor
+
+from loaddata import source_signature
+import rtrace
+
+FORMATS = ['pdf', 'png', 'svg']
+SRCDIR = os.path.dirname(os.path.abspath(__file__))
+
+@functools.lru_cache(maxsize=None)
+def imported_modules(module):
+    """ Project modules imported anywhere in module.py """
+    with open(os.path.join(SRCDIR, f'{module}.py'), 'rb') as ifile:
+        tree = ast.parse(ifile.read())
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+            names.add(node.module)
+    return sorted(name for name in names
+                  if os.path.exists(os.path.join(SRCDIR, f'{name}.py')))
+
+def dependencies(module):
+    """ module and the project modules it depends on """
+    deps, todo = set(), [module]
+    while todo:
+        name = todo.pop()
+        if name not in deps:
+            deps.add(name)
+            todo.extend(imported_modules(name))
+    return sorted(deps)
+
+def code_version(module):
+    """ Hash of the sources of module and its dependencies """
+    sha = hashlib.sha1()
+    for name in dependencies(module):
+        with open(os.path.join(SRCDIR, f'{name}.py'), 'rb') as ifile:
+            sha.update(name.encode() + ifile.read())
+    return sha.hexdigest()
+
+def export_key(module, **params):
+    """ Hash of (input data, plot parameters, code version of the module
+        drawing the figure) """
+    record = {'data': source_signature(), 'code': code_version(module), 'params': params}
+    return hashlib.sha1(json.dumps(record, sort_keys=True).encode()).hexdigest()
+
+def key_path(path):
+    head, tail = os.path.split(path)
+    return os.path.join(head, f'.{tail}.export')
+
+def read_key(path):
+    try:
+        with open(key_path(path), 'r') as ifile:
+            return ifile.read().strip()
+    except FileNotFoundError:
+        return None
+
+def is_current(path, key):
+    return os.path.exists(path) and read_key(path) == key
+
+def stale_outputs(basename, key, formats=FORMATS):
+    """ Formats of basename.<ext> that have to be regenerated """
+    return [ext for ext in formats if not is_current(f'{basename}.{ext}', key)]
+
+def mark_current(paths, key):
+    """ Records key for the written outputs, one key file per output
+        written through a temporary file of its own so that concurrent
+        exports into the same directory do not interfere """
+    import tempfile
+
+    for path in paths:
+        kpath = key_path(path)
+        fd, tmppath = tempfile.mkstemp(suffix='.tmp', prefix=f'{os.path.basename(kpath)}.',
+                                       dir=os.path.dirname(kpath) or '.')
+        with os.fdopen(fd, 'w') as ofile:
+            ofile.write(key)
+        os.replace(tmppath, kpath)
+
+def save_pickled(payload, path):
+    """ Worker side of export_figure, returns the start and end time """
+    start = rtrace.now()
+    pickle.loads(payload).savefig(path)
+    return start, rtrace.now()
+
+def export_figure(fig, basename, key, formats=FORMATS, force=False, workers=None):
+    """ Writes the stale formats of an already drawn figure concurrently
+        in worker processes. Returns the written paths """
+    formats = formats if force else stale_outputs(basename, key, formats)
+    paths = [f'{basename}.{ext}' for ext in formats]
+    if len(paths) > 1 and workers != 1:
+        payload = pickle.dumps(fig)
+        with ProcessPoolExecutor(max_workers=workers or len(paths)) as pool:
+            times = list(pool.map(save_pickled, [payload] * len(paths), paths))
+        for path, (start, end) in zip(paths, times):
+            rtrace.add_span(f'savefig.{path.rsplit(".", 1)[-1]}', start, end, worker=1)
+    else:
+        for path in paths:
+            with rtrace.span(f'savefig.{path.rsplit(".", 1)[-1]}'):
+                fig.savefig(path)
+    mark_current(paths, key)
+    return paths
@@ -0,0 +1,51 @@
+#! /usr/bin/env python
+
+""" Import-time budget per entry point """
+
+import sys
+import subprocess
+
+# entry point: (modules, budget in ms, modules that must not be loaded)
+BUDGETS = {
+    'data':     (['loaddata'], 200, ['pandas', 'matplotlib']),
+    'theory':   (['rpredict', 'tauxsec'], 200, ['pandas', 'matplotlib']),
+    'plotting': (['rplot'], 300, ['matplotlib.pyplot', 'mpld3']),
+}
+
+PROBE = """
+import sys, time
+t = time.perf_counter()
+{imports}
+print((time.perf_counter() - t) * 1000, ' '.join(sorted(sys.modules)))
+"""
+
+def measure(modules, repeat=5):
+    """ Best import time in ms in a fresh interpreter and the loaded modules """
+    imports = '\n'.join(f'import {mod}' for mod in modules)
+    best, loaded = None, set()
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', PROBE.format(imports=imports)],
+                             capture_output=True, text=True, check=True).stdout.split()
+        best = float(out[0]) if best is None else min(best, float(out[0]))
+        loaded = set(out[1:])
+    return best, loaded
+
+def check_budgets(budgets=BUDGETS):
+    """ Returns {entry: (time, budget, forbidden modules loaded)} """
+    report = {}
+    for entry, (modules, budget, forbidden) in budgets.items():
+        time, loaded = measure(modules)
+        report[entry] = (time, budget, [mod for mod in forbidden if mod in loaded])
+    return report
+
+def main():
+    failed = False
+    for entry, (time, budget, loaded) in check_budgets().items():
+        ok = time <= budget and not loaded
+        failed |= not ok
+        print(f'{entry:>10s}: {time:6.1f} ms (budget {budget} ms) {"ok" if ok else "FAIL"}'
+              + (f' loads {", ".join(loaded)}' if loaded else ''))
+    sys.exit(failed)
+
+if __name__ == '__main__':
+    main()
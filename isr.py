@@ -0,0 +1,104 @@
+""" Initial-state radiation with the Kuraev-Fadin structure function
+
+    sigma(s) = int_0^xmax dx W(s, x) sigma0(s (1 - x)),
+    W(s, x) = Delta beta x^(beta-1) - beta/2 (2 - x)
+              + beta^2/8 [(2 - x)(3 ln(1 - x) - 4 ln x) - 4 ln(1 - x)/x - 6 + x]
+
+    with beta = 2 alpha/pi (L - 1), L = ln(s/me^2) [Sov. J. Nucl. Phys.
+    41 (1985) 466]. The substitution u = x^beta removes the x^(beta-1)
+    singularity and the u integral uses Gauss-Legendre panels between
+    the given break points. The node energies and weights of a grid of
+    energies are computed once and reused for every Born function.
+    Vacuum polarization is not included.
+"""
+
+import functools
+import numpy as np
+
+from tauxsec import MTAU
+
+ALPHA = 1 / 137.035999
+ME = 0.51099895e-3
+ZETA2 = np.pi**2 / 6
+ZETA3 = 1.2020569031595942
+# 4 pi alpha^2 / 3 in nb GeV^2
+SIGMAMUMU = 86.8
+# Gauss-Legendre nodes per panel
+NODES = 48
+# Lowest energy of the hadronic Born cross section, nf=3 threshold of rpredict
+HADRONMIN = 1.02
+
+def beta(s):
+    return 2 * ALPHA / np.pi * (np.log(s / ME**2) - 1)
+
+def delta(s):
+    """ Soft and virtual correction Delta of W(s, x) """
+    L = np.log(s / ME**2)
+    delta2 = (9/8 - 2*ZETA2) * L**2 - (45/16 - 11/2*ZETA2 - 3*ZETA3) * L -\
+        6/5 * ZETA2**2 - 9/2 * ZETA3 - 6 * ZETA2 * np.log(2) + 3/8 * ZETA2 + 19/4
+    return 1 + ALPHA / np.pi * (1.5 * L + ZETA2 * 2 - 2) + (ALPHA / np.pi)**2 * delta2
+
+def kernel_du(s, x):
+    """ W(s, x) dx / du for u = x^beta """
+    b = beta(s)
+    hard = -b / 2 * (2 - x) + b**2 / 8 * (
+        (2 - x) * (3 * np.log1p(-x) - 4 * np.log(x)) - 4 * np.log1p(-x) / x - 6 + x)
+    return delta(s) + hard * x**(1 - b) / b
+
+@functools.lru_cache(maxsize=16)
+def isr_nodes(key, sqrtsmin, nodes, breaks):
+    """ (node energies, weights) of shape (energies, nodes) for the
+        energies in key (bytes of a float64 array) """
+    sqrts = np.frombuffer(key)
+    s = sqrts[:, None]**2
+    b = beta(s)
+    xmax = np.clip(1 - sqrtsmin**2 / s, 0, None)
+    edges = [np.zeros_like(s)] + [
+        np.clip(1 - brk**2 / s, 0, xmax)**b for brk in sorted(breaks, reverse=True)
+        if brk > sqrtsmin] + [xmax**b]
+    t, w = np.polynomial.legendre.leggauss(nodes)
+    u = np.concatenate([lo + (hi - lo) * (t + 1) / 2 for lo, hi in zip(edges, edges[1:])], axis=1)
+    du = np.concatenate([(hi - lo) * w / 2 for lo, hi in zip(edges, edges[1:])], axis=1)
+    x = np.where(du > 0, u, 0.5)**(1 / b)
+    energies = np.sqrt(s * (1 - x))
+    weights = np.where(du > 0, du * kernel_du(s, x), 0)
+    energies.flags.writeable = weights.flags.writeable = False
+    return energies, weights
+
+def isr_convolve(born, sqrts, sqrtsmin, nodes=NODES, breaks=()):
+    """ Radiatively corrected cross section of the vectorized Born function
+        born(sqrts), which vanishes below sqrtsmin. breaks are sqrt(s)
+        values around which born varies quickly, e.g. M -+ a few widths of
+        a narrow resonance, each interval between them gets its own panel """
+    sqrts = np.asarray(sqrts, dtype=float)
+    energies, weights = isr_nodes(np.ascontiguousarray(sqrts.ravel()).tobytes(),
+                                  sqrtsmin, nodes, tuple(breaks))
+    return np.sum(weights * born(energies), axis=1).reshape(sqrts.shape)
+
+def resonance_breaks(table=None, scales=(5, 100)):
+    """ Break points at M -+ scale * width below M/10 for every resonance
+        of a lineshape table, nested panels resolve the narrow peaks """
+    from lineshape import RESONANCES
+    return tuple(sorted(row[1] + sign * scale * row[2] for row in table or RESONANCES
+                        for scale in scales if scale * row[2] < row[1] / 10
+                        for sign in (-1, 1)))
+
+def hadronic_born(sqrts, rfunc=None):
+    """ R(s) sigma_mumu(s) in nb, R from rewqcd by default """
+    if rfunc is None:
+        from rpredict import rewqcd as rfunc
+    s = np.asarray(sqrts, dtype=float)**2
+    return rfunc(s) * SIGMAMUMU / s
+
+def tau_xsec_isr(sqrts, nodes=NODES):
+    from tauxsec import tau_xsec
+    return isr_convolve(tau_xsec, sqrts, 2 * MTAU, nodes)
+
+def hadronic_xsec_isr(sqrts, rfunc=None, nodes=NODES, breaks=()):
+    return isr_convolve(lambda x: hadronic_born(x, rfunc), sqrts, HADRONMIN, nodes, breaks)
+
+def lineshape_isr(sqrts, table=None, coherent=False, nodes=NODES):
+    from lineshape import RESONANCES, lineshape
+    table = table or RESONANCES
+    return isr_convolve(lambda x: lineshape(x, table, coherent), sqrts, HADRONMIN, nodes,
+                        resonance_breaks(table))
@@ -0,0 +1,86 @@
+""" Resonance lineshapes in e+e- annihilation
+
+    sigma(s) = GEV2NB * |sum_k A_k(s)|^2 (coherent) or sum_k |A_k(s)|^2
+    with the relativistic Breit-Wigner amplitudes
+
+        A_k(s) = sqrt(12 pi Gee_k G_k B_k) exp(i phi_k) / (s - M_k^2 + i M_k G_k)
+
+    peaking at 12 pi / M^2 Bee B. RESONANCES holds the charmonium states
+    with a measured Gee, the Y(4230) is not included. The beam energy
+    spread is a Gaussian in sqrt(s) applied by FFT convolution on a
+    uniform grid fine enough for the narrowest resonance.
+"""
+
+import functools
+import numpy as np
+
+GEV2NB = 0.3894e6  # (hbar c)^2 in GeV^2 nb
+# Typical c.m. energy spread of a charm factory (GeV)
+BEAMSPREAD = 1.0e-3
+# Half width of the smearing kernel in units of the spread
+NSIGMA = 6
+# Grid points per the smaller of the spread and the narrowest width
+STEPS = 4
+
+#  name     mass (GeV) width (GeV) Gee (GeV)  B(hadrons) phase
+RESONANCES = [
+    ['jpsi',    3.09690,   92.9e-6,  5.550e-6, 0.877, 0.],
+    ['psi2s',   3.68610,  294.0e-6,  2.279e-6, 0.978, 0.],
+    ['psi3770', 3.7737,    27.2e-3,  0.262e-6, 1.,    0.],
+    ['psi4040', 4.039,     80.0e-3,  0.86e-6,  1.,    0.],
+    ['psi4160', 4.191,     70.0e-3,  0.48e-6,  1.,    0.],
+    # The Y(4230) is omitted: only Gee times branching fractions to
+    # exclusive final states are measured, its Gee is not established
+]
+
+def table_arrays(table=RESONANCES):
+    """ Columns (mass, width, gammaee, bhad, phase) of a resonance table """
+    return tuple(np.array([row[col] for row in table], dtype=float) for col in range(1, 6))
+
+def amplitudes(sqrts, table=RESONANCES):
+    """ Complex amplitudes of shape sqrts.shape + (len(table),) """
+    mass, width, gammaee, bhad, phase = table_arrays(table)
+    s = np.asarray(sqrts, dtype=float)[..., None]**2
+    coupling = np.sqrt(12 * np.pi * gammaee * width * bhad) * np.exp(1j * phase)
+    return coupling / (s - mass**2 + 1j * mass * width)
+
+def lineshape(sqrts, table=RESONANCES, coherent=False):
+    """ Born cross section (nb) of all resonances at every energy """
+    amp = amplitudes(sqrts, table)
+    if coherent:
+        return GEV2NB * np.abs(amp.sum(axis=-1))**2
+    return GEV2NB * np.sum(np.abs(amp)**2, axis=-1)
+
+@functools.lru_cache(maxsize=32)
+def gaussian_kernel(nfft, step, spread):
+    """ rfft of a unit-sum Gaussian centered at index 0 of a periodic
+        grid of nfft points """
+    half = int(np.ceil(NSIGMA * spread / step))
+    offsets = np.arange(-half, half + 1)
+    kernel = np.zeros(nfft)
+    kernel[offsets % nfft] = np.exp(-0.5 * (offsets * step / spread)**2)
+    kernel_fft = np.fft.rfft(kernel / kernel.sum())
+    kernel_fft.flags.writeable = False
+    return kernel_fft
+
+def smear(func, sqrts, spread, step):
+    """ func convolved with a Gaussian of width spread in sqrt(s), evaluated
+        on a uniform grid of the given step and interpolated to sqrts """
+    sqrts = np.asarray(sqrts, dtype=float)
+    margin = NSIGMA * spread
+    lo, hi = sqrts.min() - margin, sqrts.max() + margin
+    npts = int(np.ceil((hi - lo) / step)) + 1
+    grid = lo + step * np.arange(npts)
+    nfft = 1 << int(np.ceil(np.log2(npts + margin / step + 1)))
+    smeared = np.fft.irfft(np.fft.rfft(func(grid), nfft) * gaussian_kernel(nfft, step, spread),
+                           nfft)[:npts]
+    return np.interp(sqrts, grid, smeared)
+
+def visible_lineshape(sqrts, spread=BEAMSPREAD, table=RESONANCES, coherent=False):
+    """ lineshape smeared by the beam energy spread, spread=0 gives the
+        Born lineshape """
+    if not spread:
+        return lineshape(sqrts, table, coherent)
+    _, width, _, _, _ = table_arrays(table)
+    step = min(spread, width.min()) / STEPS
+    return smear(lambda x: lineshape(x, table, coherent), sqrts, spread, step)
@@ -2,35 +2,278 @@
 
 import os
 import json
-import pandas as pd
+import functools
+import numpy as np
 from typing import Callable
 
+import ragged
+import rtrace
+
 DATAPATH = './data'
+CACHENAME = 'store.npz'
+
+COLUMNS = ['E', 'dEp', 'dEn', 'R', 'dRp', 'dRn', 'statp', 'statn']
+LISTCOLUMNS = ['systp', 'systn', 'corrp', 'corrn']
 
-def get_jsons(exclude=[]):
-    for item in os.listdir(DATAPATH):
-        if item.endswith('.json'):
-            yield os.path.join(DATAPATH, item)
+def get_jsons(exclude=[], datapath=DATAPATH):
+    for item in sorted(os.listdir(datapath)):
+        if item.endswith('.json') and item not in exclude:
+            yield os.path.join(datapath, item)
 
 def json_to_df(ijson):
+    import pandas as pd
+
     with open(ijson, 'r') as ij:
         data = json.load(ij)
-    return (pd.Series(data['meta']),
-            pd.DataFrame(pd.Series(item) for item in data['data']))
+    cols = {key: np.array([item[key] for item in data['data']], dtype=float) for key in COLUMNS}
+    for key in LISTCOLUMNS:
+        cols.update(ragged.padded_columns(key, *ragged.to_padded(
+            *ragged.from_lists([item[key] for item in data['data']]))))
+    return pd.Series(data['meta']), pd.DataFrame(cols)
+
+def source_signature(datapath=DATAPATH):
+    """ (file name, mtime, size) of every source JSON """
+    return [[os.path.basename(path), st.st_mtime_ns, st.st_size]
+            for path, st in ((p, os.stat(p)) for p in get_jsons(datapath=datapath))]
+
+def compile_store(datapath=DATAPATH):
+    """ Parse all source JSONs into flat column arrays """
+    metas, offsets = [], [0]
+    cols = {key: [] for key in COLUMNS}
+    lists = {key: [] for key in LISTCOLUMNS}
+    for path in get_jsons(datapath=datapath):
+        with open(path, 'r') as ij:
+            data = json.load(ij)
+        metas.append(dict(data['meta'], file=os.path.basename(path)))
+        offsets.append(offsets[-1] + len(data['data']))
+        for item in data['data']:
+            for key in COLUMNS:
+                cols[key].append(item[key])
+            for key in LISTCOLUMNS:
+                lists[key].append(item[key])
+
+    arrays = {key: np.array(val, dtype=float) for key, val in cols.items()}
+    for key, val in lists.items():
+        arrays[f'{key}_val'], arrays[f'{key}_off'] = ragged.from_lists(val)
+    arrays['offsets'] = np.array(offsets)
+    arrays['meta'] = np.array(json.dumps(metas))
+    return arrays
+
+def write_store(arrays, signature, cachepath):
+    """ Writes to a temporary file of its own and renames it, processes
+        rebuilding a stale cache at the same time do not interfere """
+    import tempfile
+
+    fd, tmppath = tempfile.mkstemp(suffix='.tmp', prefix=f'{os.path.basename(cachepath)}.',
+                                   dir=os.path.dirname(cachepath) or '.')
+    try:
+        with os.fdopen(fd, 'wb') as ofile:
+            np.savez(ofile, signature=np.array(json.dumps(signature)), **arrays)
+        os.replace(tmppath, cachepath)
+    except BaseException:
+        os.remove(tmppath)
+        raise
+
+def read_store(cachepath, signature):
+    """ Cached arrays or None if the cache is missing or stale """
+    if not os.path.exists(cachepath):
+        return None
+    with np.load(cachepath) as npz:
+        if json.loads(str(npz['signature'])) != signature:
+            return None
+        return {key: npz[key] for key in npz.files if key != 'signature'}
+
+def map_store(datapath=DATAPATH):
+    """ Store columns memory-mapped from the uncompressed npz members, the
+        pages of a slice are read when it is accessed. The cache is rebuilt
+        first if stale """
+    import struct
+    import zipfile
+
+    cachepath = os.path.join(datapath, CACHENAME)
+    try:
+        with np.load(cachepath) as npz:
+            current = json.loads(str(npz['signature'])) == source_signature(datapath)
+    except FileNotFoundError:
+        current = False
+    if not current:
+        load_store(datapath)
+
+    arrays = {}
+    with zipfile.ZipFile(cachepath) as zfile, open(cachepath, 'rb') as ifile:
+        for info in zfile.infolist():
+            key = info.filename[:-len('.npy')]
+            if key == 'signature':
+                continue
+            ifile.seek(info.header_offset + 26)
+            namelen, extralen = struct.unpack('<HH', ifile.read(4))
+            ifile.seek(info.header_offset + 30 + namelen + extralen)
+            version = np.lib.format.read_magic(ifile)
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(ifile) if version == (1, 0)\
+                else np.lib.format.read_array_header_2_0(ifile)
+            if info.compress_type != zipfile.ZIP_STORED or dtype.hasobject or\
+                    not np.prod(shape, dtype=int):
+                with zfile.open(info) as member:
+                    arrays[key] = np.lib.format.read_array(member)
+            else:
+                arrays[key] = np.memmap(cachepath, dtype=dtype, mode='r', offset=ifile.tell(),
+                                        shape=shape, order='F' if fortran else 'C')
+    return arrays
+
+def load_store(datapath=DATAPATH, validate=False):
+    """ Columnar measurement store, rebuilt only when a source JSON changes.
+        With validate the store is checked and violations are issued as a
+        warning """
+    cachepath = os.path.join(datapath, CACHENAME)
+    with rtrace.span('load', cached=1) as args:
+        signature = source_signature(datapath)
+        arrays = read_store(cachepath, signature)
+        if arrays is None:
+            args['cached'] = 0
+            with rtrace.span('load.json', files=len(signature)):
+                arrays = compile_store(datapath)
+            write_store(arrays, signature, cachepath)
+        args['rows'] = arrays['E'].size
+    if validate:
+        check_store(arrays, datapath)
+    return arrays
+
+def check_store(arrays, datapath=DATAPATH):
+    import warnings
+    from validate import validate_store, format_report
+
+    with rtrace.span('validate'):
+        report = validate_store(arrays)
+    if report:
+        warnings.warn(f'{datapath}: {sum(map(len, report.values()))} violations\n'
+                      f'{format_report(report)}', stacklevel=3)
+    return report
+
+@functools.lru_cache(maxsize=None)
+def get_store(datapath=DATAPATH, validate=False):
+    """ Store loaded once per process """
+    return load_store(datapath, validate)
+
+def store_metas(arrays):
+    return json.loads(str(arrays['meta']))
+
+def energy_index(arrays):
+    """ Store positions sorted by energy """
+    order = np.argsort(arrays['E'], kind='stable')
+    return order, arrays['E'][order]
+
+@functools.lru_cache(maxsize=None)
+def get_index(datapath=DATAPATH):
+    return energy_index(get_store(datapath))
+
+def positions_in_range(arrays, index, lo, hi):
+    """ Store positions with lo < E < hi grouped by experiment,
+        O(log n + k) for k matching points """
+    order, energy = index
+    first = np.searchsorted(energy, lo, side='right')
+    last = np.searchsorted(energy, hi, side='left')
+    pos = np.sort(order[first:last])
+    if not pos.size:
+        return {}
+    exp = np.searchsorted(arrays['offsets'], pos, side='right') - 1
+    splits = np.flatnonzero(np.diff(exp)) + 1
+    return dict(zip(exp[np.r_[0, splits]].tolist(), np.split(pos, splits)))
+
+def store_to_df(arrays, pos, offset=0):
+    """ DataFrame of the store points at positions pos """
+    import pandas as pd
+
+    cols = {key: arrays[key][pos] for key in COLUMNS}
+    for key in LISTCOLUMNS:
+        cols.update(ragged.padded_columns(key, *ragged.to_padded(
+            arrays[f'{key}_val'], arrays[f'{key}_off'], pos)))
+    return pd.DataFrame(cols, index=pos - offset)
+
+def store_to_dfs(arrays):
+    """ Yields (meta, df) per experiment in the json_to_df format """
+    import pandas as pd
+
+    offsets = arrays['offsets']
+    for idx, meta in enumerate(store_metas(arrays)):
+        meta.pop('file')
+        pos = np.arange(offsets[idx], offsets[idx+1])
+        yield pd.Series(meta), store_to_df(arrays, pos, offsets[idx])
+
+def measurements_in_range(lo:float, hi:float, fil:Callable=None, datapath=DATAPATH):
+    import pandas as pd
+
+    arrays, index = get_store(datapath), get_index(datapath)
+    metas = store_metas(arrays)
+    meas = []
+    with rtrace.span('range_query', lo=lo, hi=hi, rows=0) as args:
+        for idx, pos in positions_in_range(arrays, index, lo, hi).items():
+            meta = metas[idx]
+            meta.pop('file')
+            meta = pd.Series(meta)
+            df = store_to_df(arrays, pos, arrays['offsets'][idx])
+            if fil is not None:
+                df = fil(meta, df)
+            if df.size:
+                args['rows'] += df.shape[0]
+                meas.append([meta, df])
+        args['experiments'] = len(meas)
+    rtrace.count('range_query.experiments', len(meas))
+    rtrace.count('range_query.points', args['rows'])
+    return sorted(meas, key=lambda x: -x[0].year)
+
+def select_experiments(metas, experiments=None, codes=None, ymin=None, ymax=None):
+    """ Indices of the metas passing the metadata predicates """
+    return [idx for idx, meta in enumerate(metas)
+            if (experiments is None or meta['experiment'] in experiments) and
+            (codes is None or meta['code'] in codes) and
+            (ymin is None or meta['year'] >= ymin) and
+            (ymax is None or meta['year'] <= ymax)]
+
+def query(lo=None, hi=None, experiments=None, codes=None, ymin=None, ymax=None,
+          maxerr=None, maxrelerr=None, datapath=DATAPATH):
+    """ [(meta, df), ...] in the measurements_in_range format. Metadata
+        predicates select the experiments first, the point predicates are
+        evaluated on the store columns of the selected experiments only and
+        the others are never turned into DataFrames. Point predicates:
+        lo < E < hi, max(dRp, dRn) <= maxerr and max(dRp, dRn) <= maxrelerr * R """
+    import pandas as pd
 
-def measurements_in_range(lo:float, hi:float, fil:Callable=None):
+    arrays = get_store(datapath)
+    metas = store_metas(arrays)
+    offsets = arrays['offsets']
     meas = []
-    for meta, df in map(json_to_df, get_jsons()):
-        df = df[(df.E > lo) & (df.E < hi)]
-        if fil is not None:
-            df = fil(meta, df)
-        if df.size:
-            print(f'{meta.code:>14} {meta.experiment:>14s} {meta.year % 100:02d}: {df.shape[0]:2d} points')
-            meas.append([meta, df])
+    with rtrace.span('query', rows=0) as args:
+        selected = select_experiments(metas, experiments, codes, ymin, ymax)
+        args['experiments'] = len(selected)
+        if not selected:
+            return meas
+        pos = np.concatenate([np.arange(offsets[idx], offsets[idx+1]) for idx in selected])
+        exp = np.repeat(selected, np.diff(offsets)[selected])
+        E = arrays['E'][pos]
+        err = np.maximum(arrays['dRp'][pos], arrays['dRn'][pos])
+        mask = np.ones(pos.size, dtype=bool)
+        if lo is not None:
+            mask &= E > lo
+        if hi is not None:
+            mask &= E < hi
+        if maxerr is not None:
+            mask &= err <= maxerr
+        if maxrelerr is not None:
+            mask &= err <= maxrelerr * arrays['R'][pos]
+        pos, exp = pos[mask], exp[mask]
+        args['rows'] = pos.size
+        if not pos.size:
+            return meas
+        splits = np.flatnonzero(np.diff(exp)) + 1
+        for group, idx in zip(np.split(pos, splits), exp[np.r_[0, splits]].tolist()):
+            meta = metas[idx]
+            meta.pop('file')
+            meas.append([pd.Series(meta), store_to_df(arrays, group, offsets[idx])])
     return sorted(meas, key=lambda x: -x[0].year)
 
 def main():
-    measurements_in_range(2, 7)
+    for meta, df in measurements_in_range(2, 7):
+        print(f'{meta.code:>14} {meta.experiment:>14s} {meta.year % 100:02d}: {df.shape[0]:2d} points')
 
 if __name__ == '__main__':
     main()
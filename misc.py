@@ -17,10 +17,6 @@ baryons = [
     ['omega_c_zero', 2.6852   , 'ssc'],
 ]
 
-print('baryons:')
-for name, mass, quarks in baryons:
-    print(f'{name:>15s} ({quarks}): {2*mass:.3f}: {x0 + delta * (2*mass - 2):.2f}')
-
 charmonium = [
     ['jpsi', 3.096, 92.9e-6],
     ['psi2s', 3.68610, 294e-6],
@@ -30,9 +26,16 @@ charmonium = [
     ['y4230', 4.220, 0.050],
 ]
 
-print('ccbar:')
-for name, mass, width in charmonium:
-    print(f'{name:>15s}: {mass:.3f}: {x0 + delta * (mass - 2):.2f}')
+def main():
+    print('baryons:')
+    for name, mass, quarks in baryons:
+        print(f'{name:>15s} ({quarks}): {2*mass:.3f}: {x0 + delta * (2*mass - 2):.2f}')
+
+    print('ccbar:')
+    for name, mass, width in charmonium:
+        print(f'{name:>15s}: {mass:.3f}: {x0 + delta * (mass - 2):.2f}')
 
+    print(f'tau: {2*1.77682:.3f}: {x0 + delta * (2*1.77682 - 2):.2f}')
 
-print(f'tau: {2*1.77682:.3f}: {x0 + delta * (2*1.77682 - 2):.2f}')
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+#! /usr/bin/env python
+
+""" Multi-resolution pyramid of the measurement store
+
+    Level k holds every experiment merged by rfilter with deltaE =
+    LEVELS[k] and is tiled in energy with tiles of TILEPOINTS * deltaE
+    width. A view of [lo, hi] at npix pixels loads the finest level whose
+    deltaE is at least a pixel and only the tiles overlapping the window.
+
+    Layout of odir: pyramid.json (levels, tiles and experiments) and
+    L<level>/<tile>.json with a columnar payload per experiment id.
+"""
+
+import os
+import json
+import functools
+import numpy as np
+
+from loaddata import get_store, store_to_dfs
+from datafilter import rfilter
+from rinteractive import columns_payload
+from export import export_key, is_current, mark_current
+
+PYRAMIDPATH = 'plots/pyramid'
+LEVELS = [0.001 * 2**k for k in range(10)]
+TILEPOINTS = 256
+COLUMNS = ['E', 'dEn', 'dEp', 'R', 'dRn', 'dRp']
+
+def build_pyramid(odir=PYRAMIDPATH, levels=LEVELS, deltaSigma=2, decimals=4, force=False):
+    """ Writes all levels and tiles, skipped if the pyramid is current """
+    key = export_key('pyramid', plot='pyramid', levels=levels, deltaSigma=deltaSigma,
+                     tilepoints=TILEPOINTS, decimals=decimals)
+    ipath = os.path.join(odir, 'pyramid.json')
+    if not force and is_current(ipath, key):
+        return False
+
+    data = list(store_to_dfs(get_store()))
+    index = {
+        'deltaSigma': deltaSigma,
+        'experiments': [dict(meta, id=f'exp{idx}') for idx, (meta, _) in enumerate(data)],
+        'levels': [],
+    }
+    for level, deltaE in enumerate(levels):
+        width = TILEPOINTS * deltaE
+        tiles = {}
+        for idx, (_, df) in enumerate(data):
+            df = rfilter(df, deltaE, deltaSigma)
+            tile = np.floor(df.E.to_numpy() / width).astype(int)
+            for itile in np.unique(tile).tolist():
+                tiles.setdefault(itile, {})[f'exp{idx}'] =\
+                    columns_payload(df[tile == itile], COLUMNS, decimals)
+
+        os.makedirs(os.path.join(odir, f'L{level}'), exist_ok=True)
+        for itile, payload in tiles.items():
+            with open(os.path.join(odir, f'L{level}', f'{itile}.json'), 'w') as ofile:
+                json.dump(payload, ofile, separators=(',', ':'))
+        index['levels'].append({'deltaE': deltaE, 'width': width, 'tiles': sorted(tiles)})
+
+    for item in index['experiments']:
+        item.update({key: val.item() for key, val in item.items() if isinstance(val, np.generic)})
+    with open(ipath, 'w') as ofile:
+        json.dump(index, ofile, separators=(',', ':'))
+    mark_current([ipath], key)
+    read_index.cache_clear()
+    read_tile.cache_clear()
+    return True
+
+@functools.lru_cache(maxsize=None)
+def read_index(odir=PYRAMIDPATH):
+    with open(os.path.join(odir, 'pyramid.json'), 'r') as ifile:
+        return json.load(ifile)
+
+@functools.lru_cache(maxsize=1024)
+def read_tile(odir, level, itile):
+    with open(os.path.join(odir, f'L{level}', f'{itile}.json'), 'r') as ifile:
+        return json.load(ifile)
+
+def choose_level(index, lo, hi, npix):
+    """ Finest level merging at least one pixel worth of energy """
+    pixel = (hi - lo) / npix
+    for level, item in enumerate(index['levels']):
+        if item['deltaE'] >= pixel:
+            return level
+    return len(index['levels']) - 1
+
+def window_payload(lo, hi, npix=1000, odir=PYRAMIDPATH):
+    """ Level and columnar payload per experiment id with lo < E < hi """
+    index = read_index(odir)
+    level = choose_level(index, lo, hi, npix)
+    width = index['levels'][level]['width']
+    tiles = index['levels'][level]['tiles']
+    first, last = np.searchsorted(tiles, [np.floor(lo / width), np.floor(hi / width)],
+                                  side='left')
+    parts = {}
+    for itile in tiles[first:last+1]:
+        for expid, payload in read_tile(odir, level, itile).items():
+            parts.setdefault(expid, []).append(payload)
+
+    experiments = {}
+    for expid, payloads in parts.items():
+        cols = {key: np.concatenate([item[key] for item in payloads]) for key in COLUMNS}
+        mask = (cols['E'] > lo) & (cols['E'] < hi)
+        if mask.any():
+            experiments[expid] = {key: val[mask].tolist() for key, val in cols.items()}
+    return {'level': level, 'deltaE': index['levels'][level]['deltaE'],
+            'experiments': experiments}
+
+def measurements_in_window(lo, hi, npix=1000, odir=PYRAMIDPATH):
+    """ [(meta, df), ...] of already filtered data in the measurements_in_range
+        format, to be drawn with plot_rdata(deltaE=None) """
+    import pandas as pd
+
+    metas = {item['id']: item for item in read_index(odir)['experiments']}
+    meas = []
+    for expid, cols in window_payload(lo, hi, npix, odir)['experiments'].items():
+        meta = {key: val for key, val in metas[expid].items() if key not in ('id', 'file')}
+        meas.append([pd.Series(meta), pd.DataFrame(cols)])
+    return sorted(meas, key=lambda x: -x[0].year)
+
+if __name__ == '__main__':
+    build_pyramid()
@@ -0,0 +1,58 @@
+""" Compact storage of the systp/systn/corrp/corrn uncertainty components
+
+    A component list is kept as flat float64 values with row offsets in
+    the store and as zero-padded float columns key0, key1, ... with a
+    count column nkey in DataFrames. Zero padding does not change the
+    quadrature sum.
+"""
+
+import numpy as np
+
+def from_lists(lists):
+    """ List of lists -> (flat values, offsets) """
+    val = np.array([x for item in lists for x in item], dtype=float)
+    off = np.cumsum([0] + [len(item) for item in lists])
+    return val, off
+
+def to_padded(val, off, pos=None):
+    """ Rows pos of (val, off) -> (padded 2-D array, counts) """
+    if pos is None:
+        pos = np.arange(off.size - 1)
+    counts = off[pos+1] - off[pos]
+    padded = np.zeros((pos.size, counts.max(initial=0)))
+    rows = np.repeat(np.arange(pos.size), counts)
+    cols = np.arange(rows.size) - np.repeat(np.cumsum(counts) - counts, counts)
+    padded[rows, cols] = val[np.repeat(off[pos], counts) + cols]
+    return padded, counts
+
+def columns(df, key):
+    """ Names of the padded component columns of key in df """
+    return [col for col in df.columns
+            if col.startswith(key) and col[len(key):].isdigit()]
+
+def padded(df, key):
+    return df[columns(df, key)].to_numpy(dtype=float)
+
+def padded_columns(key, values, counts):
+    """ {column name: values} of the components of key, to build a
+        DataFrame at once instead of inserting column by column """
+    cols = {f'{key}{idx}': values[:, idx] for idx in range(values.shape[1])}
+    cols[f'n{key}'] = counts
+    return cols
+
+def set_padded(df, key, values, counts):
+    """ Replaces the components of key in df """
+    old = columns(df, key)
+    if old:
+        df.drop(columns=old, inplace=True)
+    for col, column in padded_columns(key, values, counts).items():
+        df[col] = column
+
+def qsum(df, key):
+    """ Quadrature sum of the components of key for every row """
+    return np.sqrt(np.sum(padded(df, key)**2, axis=1))
+
+def to_lists(df, key):
+    """ Per-row component lists, e.g. for JSON output """
+    values = padded(df, key)
+    return [row[:count].tolist() for row, count in zip(values, df[f'n{key}'])]
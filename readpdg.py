@@ -1,62 +1,69 @@
 #! /usr/bin/env python
 
-import re
+import itertools
+import numpy as np
 import pandas as pd
+
+import ragged
 from datafilter import oplus
 from bibinfo import metainfo
 
-linere = re.compile(r"^ *(\d+\.\d+)  *(\d+\.\d+) *(\d+\.\d+) *(\d+\.\d+) *\+(\d+\.\d+) *-(\d+\.\d+) *(\d+\.\d+) *'([\S ]*)' *'([\S ]*)' *\+(\d+\.\d+) *[+-](\d+\.\d+)* '([\S ]*)'$")
-systre = re.compile(r"^ *\+(\d+\.\d+) *[+-](\d+\.\d+)* '([\S ]*)'$")
-
-def parse_item(line):
-    if line.startswith(('*', "'")):
-        return None
-    main_item = linere.findall(line)
-    if main_item:
-        item = list(main_item[0][:-1])
-        for i in list(range(7)):
-            item[i] = float(item[i])
-        for i in [7, 8]:
-            item[i] = item[i].strip()
-        for i in [9, 10]:
-            item[i] = [float(item[i])]
-        return ('main', item)
-
-    syst_item = systre.findall(line)
-    if not syst_item:
-        print(f"Can't parse {line}")
-        return None
-
-    item = list(map(float, syst_item[0][:-1]))
-    return ('syst', item)
-
-def dat_to_df(fname='data/rpp2018-hadronicrpp_page1001.dat', lo=2., hi=7.,
-         exclude=[]):
+DATFILE = 'data/rpp2018-hadronicrpp_page1001.dat'
+
+# Fixed-width columns of the table, see the fortran reader at the end of the file
+FIELDS = [('Ecm', 0, 10), ('EcmLo', 12, 22), ('EcmHi', 23, 33), ('R', 35, 45),
+          ('statp', 47, 57), ('statn', 58, 68), ('norm', 70, 80)]
+CODE, REF = slice(83, 98), slice(101, 116)
+SYSTP, SYSTN = slice(119, 125), slice(126, 132)
+
+def iter_records(fname):
+    """ Yields (values, code, ref, systp, systn) per point joining
+        the syst continuation lines. Uncertainties are in % of R """
+    record = None
     with open(fname, 'r') as ifile:
-        data = []
         for line in ifile:
-            parsed = parse_item(line)
-            if not parsed:
+            if line.startswith(('*', "'")) or not line.strip():
                 continue
-            itype, item = parsed
-            if itype == 'main':
-                data.append(item)
-            else:
-                for i in [-1, -2]:
-                    data[-1][i].append(item[i])
-
-    df = pd.DataFrame(data)
-    df.columns = ['Ecm', 'EcmLo', 'EcmHi', 'R', 'statp', 'statn', 'norm', 'code', 'ref', 'systp', 'systn']
+            try:
+                systp, systn = abs(float(line[SYSTP])), abs(float(line[SYSTN]))
+                if line[:10].strip():
+                    values = [abs(float(line[lo:hi])) for _, lo, hi in FIELDS]
+                    if record is not None:
+                        yield record
+                    record = (values, line[CODE].strip(), line[REF].strip(), [systp], [systn])
+                    continue
+                if record is not None:
+                    record[3].append(systp)
+                    record[4].append(systn)
+                    continue
+            except ValueError:
+                pass
+            print(f"Can't parse {line}")
+    if record is not None:
+        yield record
+
+def dat_to_df(fname=DATFILE, lo=2., hi=7., exclude=[]):
+    """ Reads one or several PDG hadronic R tables """
+    fnames = [fname] if isinstance(fname, str) else fname
+    values, codes, refs, systp, systn = [], [], [], [], []
+    for record in itertools.chain.from_iterable(map(iter_records, fnames)):
+        for column, item in zip([values, codes, refs, systp, systn], record):
+            column.append(item)
+
+    df = pd.DataFrame(np.array(values).reshape(-1, len(FIELDS)),
+                      columns=[name for name, _, _ in FIELDS])
     df['norm']  = 0.01 * df.R * df.norm
-    df['systp'] = df.apply(lambda x: [0.01 * x.R * item for item in x.systp], axis=1)
-    df['systn'] = df.apply(lambda x: [0.01 * x.R * item for item in x.systn], axis=1)
-    df['errp']  = df.apply(lambda x: oplus(x.statp, x.norm, *x.systp), axis=1)
-    df['errn']  = df.apply(lambda x: oplus(x.statn, x.norm, *x.systn), axis=1)
-    df = df[(df.Ecm < hi) & (df.Ecm > lo)]
-    df = df[df.apply(lambda x: x.code not in exclude, axis=1)]
-    print(df.head(50))
-    print(df.shape)
-    return df
+    df['code']  = codes
+    df['ref']   = refs
+    scale = 0.01 * df.R.to_numpy()[:, None]
+    for key, lists in [('systp', systp), ('systn', systn)]:
+        values, counts = ragged.to_padded(*ragged.from_lists(lists))
+        ragged.set_padded(df, key, scale * values, counts)
+    df['errp']  = oplus(df.statp, df.norm, ragged.qsum(df, 'systp'))
+    df['errn']  = oplus(df.statn, df.norm, ragged.qsum(df, 'systn'))
+    return df[(df.Ecm < hi) & (df.Ecm > lo) & ~df.code.isin(exclude)]
 
 if __name__ == '__main__':
-    dat_to_df()
+    df = dat_to_df()
+    print(df.head(50))
+    print(df.shape)
@@ -1,15 +1,16 @@
 #! /usr/bin/env python
 
 import os
-import numpy as np
-import matplotlib
-matplotlib.rcParams.update({'font.size': 16})
-import matplotlib.pyplot as plt
-import mpld3
 import re
+import json
+import numpy as np
 
 from loaddata import measurements_in_range
-from rplot import rplot
+from datafilter import cached_rfilter
+from rpredict import rew, rewqcd
+from colors import kelly_gen
+from rplot import rplot, set_style
+from export import export_key, is_current, stale_outputs, export_figure, mark_current
 
 def static_js_url():
     return '/static/sct/js'
@@ -20,24 +21,197 @@ def d3url():
 def mpld3url():
     return os.path.join(static_js_url(), 'mpld3.v0.5.1.min.js')
 
-def interactive_r(lo=2, hi=7, deltaE=0.01, deltaSigma=2, opath='plots/rplotd3.html'):
+def figure_html(fig):
+    import mpld3
+
+    html = mpld3.fig_to_html(fig, figid='rplot', d3_url=d3url(), mpld3_url=mpld3url())
+    html = re.sub(r'(\d+\.\d{4})\d+', r'\1', html)
+    return re.sub(r'el\d+(\d{5})', 'el' + r'\1', html)
+
+def interactive_r(lo=2, hi=7, deltaE=0.01, deltaSigma=2, opath='plots/rplotd3.html',
+                  show=True, force=False):
+    basename = os.path.splitext(opath)[0]
+    key = export_key('rinteractive', plot='interactive_r', lo=lo, hi=hi, deltaE=deltaE,
+                     deltaSigma=deltaSigma)
+    if not (show or force or stale_outputs(basename, key) or not is_current(opath, key)):
+        return
+
+    import matplotlib.pyplot as plt
+
+    set_style()
     fig, ax = plt.subplots(figsize=(12, 8))
     data = measurements_in_range(lo, hi)
     rplot(ax, data, lo, hi, deltaE, deltaSigma, legendsize=14,
           xlbl='Energy (GeV)', lblsize=20, msize=3)
     fig.tight_layout()
 
-    html = mpld3.fig_to_html(fig, figid='rplot', d3_url=d3url(), mpld3_url=mpld3url())
-    html = re.sub(r'(\d+\.\d{4})\d+', r'\1', html)
-    html = re.sub(r'el\d+(\d{5})', 'el' + r'\1', html)
-    
+    html = figure_html(fig)
     with open(opath, 'w') as ofile:
         ofile.write(html)
+    mark_current([opath], key)
+
+    export_figure(fig, basename, key, force=force)
+    if show:
+        plt.show()
+
+
+# Client-side R plot: experiments are fetched from the JSON payload when
+# they are enabled and inside the zoomed energy window
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>R ratio</title>
+<script src="%D3URL%"></script>
+<style>
+body { font: 14px sans-serif; }
+#legend span { cursor: pointer; margin-right: 1em; white-space: nowrap; }
+#legend span.off { opacity: 0.3; }
+</style>
+</head>
+<body>
+<svg id="rplot" width="%WIDTH%" height="%HEIGHT%"></svg>
+<div id="legend"></div>
+<script>
+const margin = {top: 10, right: 10, bottom: 45, left: 55};
+const svg = d3.select('#rplot');
+const width = +svg.attr('width') - margin.left - margin.right;
+const height = +svg.attr('height') - margin.top - margin.bottom;
+svg.append('defs').append('clipPath').attr('id', 'clip')
+  .append('rect').attr('width', width).attr('height', height);
+const g = svg.append('g').attr('transform', `translate(${margin.left},${margin.top})`);
+const x0 = d3.scaleLinear().range([0, width]);
+const y = d3.scaleLinear().range([height, 0]);
+let x = x0;
+const xAxis = g.append('g').attr('transform', `translate(0,${height})`);
+const yAxis = g.append('g');
+g.append('text').attr('x', width / 2).attr('y', height + 38)
+  .attr('text-anchor', 'middle').text('Energy (GeV)');
+g.append('text').attr('transform', 'rotate(-90)').attr('x', -height / 2).attr('y', -40)
+  .attr('text-anchor', 'middle').text('R');
+const plot = g.append('g').attr('clip-path', 'url(#clip)');
+const requests = {};
+let index = null;
+
+function fetchData(exp) {
+  if (!(exp.file in requests)) requests[exp.file] = d3.json(exp.file);
+  return requests[exp.file];
+}
+
+function errorPaths(d, r) {
+  let bars = '', marks = '';
+  for (let i = 0; i < d.E.length; i++) {
+    const xe = x(d.E[i]), ye = y(d.R[i]);
+    bars += `M${x(d.E[i] - d.dEn[i])},${ye}H${x(d.E[i] + d.dEp[i])}` +
+            `M${xe},${y(d.R[i] - d.dRn[i])}V${y(d.R[i] + d.dRp[i])}`;
+    marks += `M${xe - r},${ye}a${r},${r} 0 1,0 ${2 * r},0a${r},${r} 0 1,0 ${-2 * r},0`;
+  }
+  return [bars, marks];
+}
+
+function draw() {
+  const [lo, hi] = x.domain();
+  xAxis.call(d3.axisBottom(x));
+  yAxis.call(d3.axisLeft(y));
+  index.theory.forEach(curve => plot.select(`#${curve.id}`)
+    .attr('d', d3.line()(curve.E.map((e, i) => [x(e), y(curve.R[i])]))));
+  index.experiments.forEach(exp => {
+    const group = plot.select(`#${exp.id}`);
+    if (!exp.visible || exp.hi < lo || exp.lo > hi) {
+      group.style('display', 'none');
+      return;
+    }
+    fetchData(exp).then(d => {
+      const [bars, marks] = errorPaths(d, 2.5);
+      group.style('display', null);
+      group.select('.bars').attr('d', bars);
+      group.select('.marks').attr('d', marks);
+    });
+  });
+}
+
+d3.json('%INDEX%').then(idx => {
+  index = idx;
+  x0.domain([idx.lo, idx.hi]);
+  y.domain(idx.ylim);
+  idx.theory.forEach(curve => plot.append('path').attr('id', curve.id)
+    .attr('fill', 'none').attr('stroke', 'black').attr('stroke-dasharray', curve.dash));
+  idx.experiments.forEach(exp => {
+    exp.visible = true;
+    const group = plot.append('g').attr('id', exp.id).style('display', 'none');
+    group.append('path').attr('class', 'bars').attr('stroke', exp.color).attr('fill', 'none');
+    group.append('path').attr('class', 'marks').attr('fill', exp.color);
+    d3.select('#legend').append('span').style('color', exp.color).text(`\u25CF ${exp.label}`)
+      .on('click', function() {
+        exp.visible = !exp.visible;
+        d3.select(this).classed('off', !exp.visible);
+        draw();
+      });
+  });
+  svg.call(d3.zoom().scaleExtent([1, 1000])
+    .translateExtent([[0, 0], [width, height]]).extent([[0, 0], [width, height]])
+    .on('zoom', () => { x = d3.event.transform.rescaleX(x0); draw(); }));
+  draw();
+});
+</script>
+</body>
+</html>
+"""
+
+def columns_payload(df, columns, decimals=4):
+    """ Columnar JSON object rounded at serialisation """
+    return {key: np.round(df[key].to_numpy(dtype=float), decimals).tolist() for key in columns}
+
+def interactive_page(lo=2, hi=7, deltaE=0.01, deltaSigma=2, odir='plots/rplotd3',
+                     decimals=4, width=1200, height=700, force=False):
+    """ Writes a page drawing the points client-side from an index and
+        one columnar JSON payload per experiment. Returns written files """
+    key = export_key('rinteractive', plot='interactive_page', lo=lo, hi=hi, deltaE=deltaE,
+                     deltaSigma=deltaSigma, decimals=decimals, width=width, height=height)
+    page = os.path.join(odir, 'index.html')
+    if not force and is_current(page, key):
+        return []
+
+    os.makedirs(odir, exist_ok=True)
+    written, experiments = [], []
+    colgen = kelly_gen()
+    for idx, (meta, df) in enumerate(measurements_in_range(lo, hi)):
+        df = cached_rfilter(df, deltaE, deltaSigma)
+        fname = f'{idx:02d}_{meta.code.replace(" ", "_")}.json'
+        experiments.append({
+            'id': f'exp{idx}',
+            'file': fname,
+            'label': f'{meta.experiment} {meta.year%100:02d}',
+            'code': meta.code,
+            'color': next(colgen),
+            'lo': round(float((df.E - df.dEn).min()), decimals),
+            'hi': round(float((df.E + df.dEp).max()), decimals),
+            'points': df.shape[0],
+        })
+        written.append(os.path.join(odir, fname))
+        with open(written[-1], 'w') as ofile:
+            json.dump(columns_payload(df, ['E', 'dEn', 'dEp', 'R', 'dRn', 'dRp'], decimals),
+                      ofile, separators=(',', ':'))
 
-    for ext in ['pdf', 'png', 'svg']:
-        plt.savefig(f'plots/rplotd3.{ext}')
+    sqrts = np.concatenate([np.linspace(lo, 3.77 - 1.e-5, 10), np.linspace(3.77 + 1.e-5, hi, 10)])
+    theory = [
+        {'id': 'naive', 'dash': '6,4', 'E': sqrts, 'R': rew(sqrts**2)},
+        {'id': 'pqcd', 'dash': None, 'E': sqrts, 'R': rewqcd(sqrts**2)},
+    ]
+    for curve in theory:
+        curve['E'] = np.round(curve['E'], decimals).tolist()
+        curve['R'] = np.round(curve['R'], decimals).tolist()
+    written.append(os.path.join(odir, 'index.json'))
+    with open(written[-1], 'w') as ofile:
+        json.dump({'lo': lo, 'hi': hi, 'ylim': [0, 5.25], 'theory': theory,
+                   'experiments': experiments}, ofile, separators=(',', ':'))
 
-    plt.show()
+    html = PAGE.replace('%D3URL%', d3url()).replace('%INDEX%', 'index.json')
+    written.append(page)
+    with open(page, 'w') as ofile:
+        ofile.write(html.replace('%WIDTH%', str(width)).replace('%HEIGHT%', str(height)))
+    mark_current(written, key)
+    return written
 
 
 if __name__ == '__main__':
@@ -1,16 +1,16 @@
 #! /usr/bin/env python
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.rcParams.update({'font.size': 16})
-
-from rpredict import rew_v, rewqcd_v
-from datafilter import rfilter
-from loaddata import measurements_in_range
+
+from rpredict import rew_v, rewqcd_v, thresholds
+from datafilter import filter_many, decimate
+from loaddata import query
 from tauxsec import tau_xsec, MTAU
+from lineshape import visible_lineshape, BEAMSPREAD, RESONANCES
+from sampling import adaptive_sample, axis_scales
 from colors import kelly_gen
+from export import export_key, stale_outputs, export_figure
+import rtrace
 
 MJPSI  = 3.09690
 MPSI2S = 3.68610
@@ -29,34 +29,83 @@ def psi_lineshape(sqrts):
            rbw(sqrts, MPSI2S, WPSI2S, GAMEEPSI2S)
 
 
-def plot_tau_xsec(ax, ylim=(0, 10.5)):
-    sqrts = np.concatenate([
-        np.linspace(2*MTAU, 2*MTAU+0.3, 150),
-        np.linspace(2*MTAU+0.3, 7, 50)
-    ])
-    taux = tau_xsec(sqrts)
-    ax.plot(sqrts, taux, label=r'$\sigma(e^+e^-\to\tau^+\tau^-)$')
+def plot_curve(ax, func, lo, hi, fmt='-', name='curve', hints=(), **kwargs):
+    """ Draws func sampled adaptively to the pixel resolution of ax, the
+        axis limits have to be set before """
+    with rtrace.span(f'theory.{name}') as args:
+        sqrts, values = adaptive_sample(func, lo, hi, *axis_scales(ax), hints=hints,
+                                        ylim=ax.get_ylim())
+        args['points'] = sqrts.size
+    ax.plot(sqrts, values, fmt, **kwargs)
 
-    sqrtsJpsi = np.linspace(MJPSI - 1e-1, MJPSI + 1e-1, 1000)
-    ax.plot(sqrtsJpsi, 30*rbw(sqrtsJpsi, MJPSI, 1e-3, GAMEEJPSI), 'k--', label=rf'$J/\psi$ (not in scale)')
-    sqrtsPsi2s = np.linspace(MPSI2S - 1e-1, MPSI2S + 1e-1, 1000)
-    ax.plot(sqrtsPsi2s, 100*rbw(sqrtsPsi2s, MPSI2S, 1e-3, GAMEEPSI2S), 'k:', label=rf'$\psi\left(2S\right)$ (not in scale)')
 
+def plot_tau_xsec(ax, ylim=(0, 10.5), isr=False):
+    """ Tau pair and charmonium cross sections, with isr also the tau
+        pair cross section with initial-state radiation """
     ax.set_ylim(ylim)
+    plot_curve(ax, tau_xsec, 2*MTAU, 7, name='tau_xsec',
+               label=r'$\sigma(e^+e^-\to\tau^+\tau^-)$')
+    if isr:
+        from isr import tau_xsec_isr
+        plot_curve(ax, tau_xsec_isr, 2*MTAU, 7, ':', name='tau_xsec_isr', color='C0',
+                   label=r'$\sigma(e^+e^-\to\tau^+\tau^-)$ with ISR')
+
+    # the initial grid would step over peaks narrower than the beam spread
+    hints = [mass + BEAMSPREAD * k for _, mass, width, *_ in RESONANCES
+             if width < BEAMSPREAD for k in range(-3, 4)]
+    plot_curve(ax, visible_lineshape, 3.0, 4.5, 'k--', name='lineshape', hints=hints,
+               label=rf'$c\bar{{c}}$ resonances, {BEAMSPREAD*1e3:.0f} MeV beam spread')
+
     ax.set_ylabel(r'$\sigma$ (nb)', fontsize=20)
     ax.legend(fontsize=14)
 
 
-def plot_rdata(ax, data, deltaE=0.01, deltaSigma=2, msize=5, keycol={}):
+def lod_buckets(ax, data, pixels=2):
+    """ Energy range and number of buckets for which each bucket spans
+        the given number of pixels along the x axis of ax """
+    if ax.get_autoscalex_on():
+        lo = min(df.E.min() for _, df in data)
+        hi = max(df.E.max() for _, df in data)
+    else:
+        lo, hi = ax.get_xlim()
+    return lo, hi, max(int(ax.get_window_extent().width / pixels), 1)
+
+
+def errorbar_arrays(df):
+    """ Keyword arrays of ax.errorbar for a measurement frame """
+    return {
+        'x': df.E.to_numpy(), 'y': df.R.to_numpy(),
+        'xerr': np.vstack([df.dEn.to_numpy(), df.dEp.to_numpy()]),
+        'yerr': np.vstack([df.dRn.to_numpy(), df.dRp.to_numpy()]),
+    }
+
+
+def prepare_rdata(data, deltaE=0.01, deltaSigma=2, lod=None, workers=None):
+    """ [(meta, errorbar arrays), ...] of the data filtered with the
+        memoized rfilter, in a process pool for large inputs. deltaE=None
+        takes data that are already filtered, lod=(lo, hi, nbins)
+        decimates the filtered points """
+    frames = [df for _, df in data]
+    if deltaE is not None:
+        frames = filter_many(frames, deltaE, deltaSigma, workers)
+    if lod is not None:
+        frames = [decimate(df, *lod) for df in frames]
+    return [(meta, errorbar_arrays(df)) for (meta, _), df in zip(data, frames)]
+
+
+def plot_rdata(ax, data, deltaE=0.01, deltaSigma=2, msize=5, keycol={}, lod=False, workers=None):
+    """ Draws the data filtered with the memoized rfilter, deltaE=None
+        draws data that are already filtered. With lod the points of each
+        experiment are reduced to what the pixel resolution of ax can show """
     colgen = kelly_gen()
-    for meta, df in data:
-        df = rfilter(df, deltaE, deltaSigma)
+    buckets = lod_buckets(ax, data) if lod and data else None
+    for meta, arrays in prepare_rdata(data, deltaE, deltaSigma, buckets, workers):
         color = keycol.get(meta.code, next(colgen))
         keycol[meta.code] = color
-        ax.errorbar(
-            x=df.E, y=df.R, xerr=(df.dEn, df.dEp), yerr=(df.dRn, df.dRp),
-            linestyle='none', markersize=msize, marker='o',
-            label=f'{meta.experiment} {meta.year%100:02d}', color=color)
+        with rtrace.span('draw.errorbar', rows=arrays['x'].size):
+            ax.errorbar(
+                **arrays, linestyle='none', markersize=msize, marker='o',
+                label=f'{meta.experiment} {meta.year%100:02d}', color=color)
 
     return keycol
 
@@ -69,18 +118,18 @@ def add_ticks(ax):
 
 def rplot(ax, data, lo=2, hi=7, deltaE=0.01, deltaSigma=2,
           legend=True, legendsize=14, lblsize=20, predictions=True,
-          xlbl=r'$\sqrt{s}$ (GeV)', msize=5):
-    keycol = plot_rdata(ax, data, deltaE, deltaSigma, msize=msize)
-    sqrts = np.concatenate([
-        np.linspace(lo, 3.77 - 1.e-5, 10),
-        np.linspace(3.77 + 1.e-5, hi, 10)
-    ])
+          xlbl=r'$\sqrt{s}$ (GeV)', msize=5, lod=False, workers=None):
+    ax.set_xlim((lo, hi))
+    keycol = plot_rdata(ax, data, deltaE, deltaSigma, msize=msize, lod=lod, workers=workers)
+    ax.set_ylim((0, 5.25))
     if predictions:
-        ax.plot(sqrts, rew_v(sqrts**2), '--', color='k', label='Naive model')
-        ax.plot(sqrts, rewqcd_v(sqrts**2), color='k', label='3-loop pQCD')
+        # both sides of the flavour thresholds
+        hints = [edge + side for edge in np.sqrt(thresholds) for side in (-1.e-5, 1.e-5)]
+        plot_curve(ax, lambda x: rew_v(x**2), lo, hi, '--', name='rew', hints=hints,
+                   color='k', label='Naive model')
+        plot_curve(ax, lambda x: rewqcd_v(x**2), lo, hi, name='rewqcd', hints=hints,
+                   color='k', label='3-loop pQCD')
 
-    ax.set_ylim((0, 5.25))
-    ax.set_xlim((lo, hi))
     ax.set_xlabel(xlbl, fontsize=lblsize)
     ax.set_ylabel('R', fontsize=lblsize)
     add_ticks(ax)
@@ -90,23 +139,36 @@ def rplot(ax, data, lo=2, hi=7, deltaE=0.01, deltaSigma=2,
     return keycol
 
 
-def simple_plot(lo=2, hi=7, deltaE=0.01, deltaSigma=2):
+def set_style():
+    import matplotlib
+    matplotlib.rcParams.update({'font.size': 16})
+
+
+def simple_plot(lo=2, hi=7, deltaE=0.01, deltaSigma=2, show=True, force=False,
+                opath='plots/rplot', lod=False):
+    key = export_key('rplot', plot='simple_plot', lo=lo, hi=hi, deltaE=deltaE,
+                     deltaSigma=deltaSigma, lod=lod)
+    if not (show or force or stale_outputs(opath, key)):
+        return
+
+    import matplotlib.pyplot as plt
+
+    set_style()
     fig, ax = plt.subplots(figsize=(18, 8))
-    fil = lambda meta, df: df if meta.year > 1989 else pd.DataFrame([])
-    data = measurements_in_range(lo, hi, fil)
+    data = query(lo, hi, ymin=1990)
 
-    keycol = rplot(ax, data, lo, hi, deltaE, deltaSigma)
+    keycol = rplot(ax, data, lo, hi, deltaE, deltaSigma, lod=lod)
     plot_tau_xsec(ax.twinx())
 
     ax0 = plt.axes([.59, .25, .33, .30])
-    data0 = measurements_in_range(3.6, 4, fil)
-    plot_rdata(ax0, data0, deltaE, deltaSigma, keycol=keycol)
+    data0 = query(3.6, 4, ymin=1990)
+    plot_rdata(ax0, data0, deltaE, deltaSigma, keycol=keycol, lod=lod)
     add_ticks(ax0)
 
     fig.tight_layout()
-    for ext in ['pdf', 'png', 'svg']:
-        plt.savefig(f'plots/rplot.{ext}')
-    plt.show()
+    export_figure(fig, opath, key, force=force)
+    if show:
+        plt.show()
 
 
 if __name__ == '__main__':
@@ -1,23 +1,17 @@
 import numpy as np
 
-from alpha_s import alpha_s_over_pi
+from alpha_s import alpha_s_over_pi, alpha_s_over_pi_rg, ASMZ
 
 charges = np.array([2, -1, -1, 2, -1, 2]) / 3
 xi   = {idx : 3*np.sum(charges[:idx]**2) for idx in range(2, charges.size+1)}
 zeta = {idx : charges[:idx].sum()**2 for idx in xi.keys()}
 eta  = {idx : b / a for (idx, a), (_, b) in zip(xi.items(), zeta.items())}
 
-for nf, r in xi.items():
-    print(f'{nf}: {r:.3f}')
+# Open flavour thresholds in s
+thresholds = np.array([1.02, 3.77, 10.58])**2
 
 def nflav(s):
-    if s < 1.02**2:
-        return 2
-    if s < 3.77**2:
-        return 3
-    if s < 10.58**2:
-        return 4
-    return 5
+    return 2 + np.searchsorted(thresholds, s, side='right')
 
 def as_c2(nf):
     return 1.9857 - 0.1152*nf
@@ -30,21 +24,41 @@ def as_c4(nf):
 
 cees = {nf: (1, as_c2(nf), as_c3(nf), as_c4(nf)) for nf in xi.keys()}
 
+# Row nf holds xi[nf] and cees[nf]
+xi_table  = np.array([np.nan, np.nan] + [xi[nf] for nf in xi.keys()])
+cee_table = np.array([np.full(4, np.nan)] * 2 + [cees[nf] for nf in xi.keys()])
+
 def rew(s):
-    return xi[nflav(s)]
+    return xi_table[nflav(s)]
 
-def rewqcd(s):
+def rqcd(s, a):
+    """ R in pQCD for a = alpha_s / pi at s """
     nf = nflav(s)
-    return xi[nf] * (1 + np.dot(cees[nf], alpha_s_over_pi(s, nf)**np.arange(1, 5)))
+    c = cee_table[nf]
+    return xi_table[nf] * (1 + a*(c[..., 0] + a*(c[..., 1] + a*(c[..., 2] + a*c[..., 3]))))
+
+def rewqcd(s, lam=0.25):
+    """ R in pQCD. s and lam are broadcast, e.g. s[:, None] and
+        lam[None, :] give a Λ scan """
+    return rqcd(s, alpha_s_over_pi(s, nflav(s), lam))
+
+def rewqcd_rg(s, asmz=ASMZ):
+    """ R in pQCD with alpha_s run from alpha_s(MZ) """
+    return rqcd(s, alpha_s_over_pi_rg(s, asmz))
+
+rew_v = rew
+rewqcd_v = rewqcd
 
-rew_v = np.vectorize(rew)
-rewqcd_v = np.vectorize(rewqcd)
+def print_flavours():
+    for nf, r in xi.items():
+        print(f'{nf}: {r:.3f}')
 
 def main():
     import matplotlib.pyplot as plt
     import matplotlib
     matplotlib.rcParams.update({'font.size': 16})
 
+    print_flavours()
     sqrts = np.linspace(2, 7, 500)
 
     fig = plt.figure(figsize=(9, 6))
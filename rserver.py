@@ -0,0 +1,202 @@
+#! /usr/bin/env python
+
+""" Local HTTP service rendering R plots
+
+    GET /plot.png, /plot.svg or /plot.html with optional parameters
+        lo, hi, deltaE, deltaSigma, experiment (comma separated),
+        ymin, ymax, lod, width, height (inches)
+    e.g. /plot.png?lo=3.6&hi=4&experiment=BES,KEDR&ymin=1990
+
+    GET /window.json?lo=3.6&hi=4&npix=1000 returns the points of the
+    window from the matching level of the data pyramid (see pyramid.py)
+
+    The measurement store is loaded once per worker process. Workers
+    keep an LRU of filtered datasets and the server an LRU of rendered
+    outputs, concurrent requests for the same output share one render.
+"""
+
+import io
+import json
+import argparse
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+    'html': 'text/html; charset=utf-8',
+}
+
+PARAMS = {
+    'lo': (float, 2.),
+    'hi': (float, 7.),
+    'deltaE': (float, 0.01),
+    'deltaSigma': (float, 2.),
+    'experiment': (str, ''),
+    'ymin': (int, 0),
+    'ymax': (int, 9999),
+    'lod': (int, 0),
+    'width': (float, 12.),
+    'height': (float, 8.),
+}
+
+def parse_params(query):
+    """ Query string -> hashable tuple of all parameters. Raises ValueError """
+    values = {key: val[-1] for key, val in parse_qs(query).items()}
+    unknown = set(values) - set(PARAMS)
+    if unknown:
+        raise ValueError(f'unknown parameters {", ".join(sorted(unknown))}')
+    params = {key: conv(values[key]) if key in values else default
+              for key, (conv, default) in PARAMS.items()}
+    if not params['lo'] < params['hi']:
+        raise ValueError('lo must be below hi')
+    params['experiment'] = ','.join(sorted(filter(None, params['experiment'].split(','))))
+    return tuple(params.items())
+
+def init_worker():
+    from loaddata import get_index
+    get_index()
+
+@functools.lru_cache(maxsize=64)
+def filtered_data(lo, hi, deltaE, deltaSigma, experiment, ymin, ymax):
+    """ Filtered measurements, cached per worker """
+    from loaddata import query
+    from datafilter import cached_rfilter
+
+    experiments = set(experiment.split(',')) if experiment else None
+    return [(meta, cached_rfilter(df, deltaE, deltaSigma))
+            for meta, df in query(lo, hi, experiments, ymin=ymin, ymax=ymax)]
+
+def render(params, fmt):
+    """ Output of one plot as bytes, runs in a worker process """
+    from matplotlib.figure import Figure
+    from rplot import rplot, set_style
+
+    p = dict(params)
+    set_style()
+    data = filtered_data(p['lo'], p['hi'], p['deltaE'], p['deltaSigma'],
+                         p['experiment'], p['ymin'], p['ymax'])
+    fig = Figure(figsize=(p['width'], p['height']))
+    ax = fig.subplots()
+    rplot(ax, data, p['lo'], p['hi'], deltaE=None, lod=bool(p['lod']))
+    fig.tight_layout()
+    if fmt == 'html':
+        from rinteractive import figure_html
+        return figure_html(fig).encode()
+    buf = io.BytesIO()
+    fig.savefig(buf, format=fmt)
+    return buf.getvalue()
+
+class PlotService:
+    """ Bounded LRU of rendered outputs in front of a worker pool """
+    def __init__(self, workers=None, cachesize=256):
+        self.pool = ProcessPoolExecutor(workers, initializer=init_worker)
+        self.cachesize = cachesize
+        self.cache = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def get(self, params, fmt):
+        key = (params, fmt)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            future = self.inflight.get(key)
+            if future is None:
+                future = self.inflight[key] = self.pool.submit(render, params, fmt)
+        try:
+            output = future.result()
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+        with self.lock:
+            self.cache[key] = output
+            while len(self.cache) > self.cachesize:
+                self.cache.popitem(last=False)
+        return output
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+def parse_window(query):
+    """ Query string -> (lo, hi, npix). Raises ValueError """
+    values = {key: val[-1] for key, val in parse_qs(query).items()}
+    lo, hi = float(values.get('lo', 2.)), float(values.get('hi', 7.))
+    npix = int(values.get('npix', 1000))
+    if not lo < hi or npix < 1:
+        raise ValueError('lo must be below hi and npix positive')
+    return lo, hi, npix
+
+class PlotHandler(BaseHTTPRequestHandler):
+    def send_output(self, output, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(output)))
+        self.end_headers()
+        self.wfile.write(output)
+
+    def do_window(self, url):
+        from pyramid import window_payload
+        try:
+            lo, hi, npix = parse_window(url.query)
+        except ValueError as err:
+            self.send_error(400, str(err))
+            return
+        payload = window_payload(lo, hi, npix, self.server.pyramid)
+        self.send_output(json.dumps(payload, separators=(',', ':')).encode(),
+                         'application/json')
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/window.json':
+            self.do_window(url)
+            return
+        fmt = url.path.rsplit('.', 1)[-1]
+        if not url.path.startswith('/plot.') or fmt not in CONTENT_TYPES:
+            self.send_error(404)
+            return
+        try:
+            params = parse_params(url.query)
+        except ValueError as err:
+            self.send_error(400, str(err))
+            return
+        try:
+            output = self.server.service.get(params, fmt)
+        except Exception as err:
+            self.send_error(500, f'{type(err).__name__}: {err}')
+            return
+        self.send_output(output, CONTENT_TYPES[fmt])
+
+def serve(host='127.0.0.1', port=8000, workers=None, cachesize=256, pyramid=None):
+    from pyramid import PYRAMIDPATH, build_pyramid
+
+    server = ThreadingHTTPServer((host, port), PlotHandler)
+    server.pyramid = pyramid or PYRAMIDPATH
+    build_pyramid(server.pyramid)
+    server.service = PlotService(workers, cachesize)
+    print(f'Serving R plots on http://{host}:{port}/plot.png')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cachesize', type=int, default=256)
+    parser.add_argument('--pyramid', default=None, help='data pyramid directory')
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.cachesize, args.pyramid)
+
+if __name__ == '__main__':
+    main()
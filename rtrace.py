@@ -0,0 +1,136 @@
+#! /usr/bin/env python
+
+""" Opt-in instrumentation with timed spans and counters
+
+    Disabled by default, span and count are then almost free. Enable
+    with enable() or by setting RTRACE to the path of a Chrome trace
+    file, written with a summary table on stderr at exit. The trace can
+    be opened in chrome://tracing or https://ui.perfetto.dev
+
+    with rtrace.span('filter', rows_in=n) as args:
+        ...
+        args['rows_out'] = m
+    rtrace.count('filter.iterations')
+
+    python rtrace.py trace.json rplot.py runs a script with tracing on
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import contextlib
+from collections import defaultdict
+
+ENVVAR = 'RTRACE'
+
+ENABLED = False
+events = []
+counters = defaultdict(float)
+lock = threading.Lock()
+
+def enable(path=None):
+    """ Starts recording, the trace is written to path at exit if given """
+    global ENABLED
+    ENABLED = True
+    if path:
+        atexit.register(finish, path)
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+def reset():
+    with lock:
+        events.clear()
+        counters.clear()
+
+def now():
+    return time.perf_counter()
+
+def add_span(name, start, end, **args):
+    """ Records a span measured elsewhere, e.g. in a worker process """
+    if not ENABLED:
+        return
+    with lock:
+        events.append({'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                       'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args})
+
+@contextlib.contextmanager
+def span(name, **args):
+    """ Times the block, args can be extended inside it """
+    if not ENABLED:
+        yield args
+        return
+    start = now()
+    try:
+        yield args
+    finally:
+        add_span(name, start, now(), **args)
+
+def count(name, value=1):
+    if not ENABLED:
+        return
+    with lock:
+        counters[name] += value
+        events.append({'name': name, 'ph': 'C', 'ts': now() * 1e6, 'pid': os.getpid(),
+                       'args': {'value': counters[name]}})
+
+def summary():
+    """ {span name: {'calls', 'total', integer args summed}} and the counters """
+    spans = {}
+    with lock:
+        for event in events:
+            if event['ph'] != 'X':
+                continue
+            item = spans.setdefault(event['name'], defaultdict(float))
+            item['calls'] += 1
+            item['total'] += event['dur'] / 1e6
+            for key, val in event['args'].items():
+                if isinstance(val, int) and not isinstance(val, bool):
+                    item[key] += val
+        return spans, dict(counters)
+
+def summary_table():
+    spans, counts = summary()
+    lines = [f'{"span":<24s} {"calls":>7s} {"total ms":>10s} {"mean ms":>9s}  totals']
+    for name, item in sorted(spans.items(), key=lambda x: -x[1]['total']):
+        extra = ' '.join(f'{key}={val:g}' for key, val in item.items()
+                         if key not in ('calls', 'total'))
+        lines.append(f'{name:<24s} {item["calls"]:7.0f} {item["total"]*1e3:10.2f} '
+                     f'{item["total"]*1e3/item["calls"]:9.3f}  {extra}')
+    if counts:
+        lines.append('')
+        lines.extend(f'{name:<24s} {val:g}' for name, val in sorted(counts.items()))
+    return '\n'.join(lines)
+
+def write_chrome_trace(path):
+    with lock:
+        payload = {'traceEvents': list(events), 'displayTimeUnit': 'ms'}
+    with open(path, 'w') as ofile:
+        json.dump(payload, ofile)
+
+def finish(path):
+    write_chrome_trace(path)
+    print(summary_table(), file=sys.stderr)
+
+if os.environ.get(ENVVAR):
+    enable(os.environ[ENVVAR])
+
+def main():
+    import runpy
+    import rtrace
+
+    if len(sys.argv) < 3:
+        print(f'usage: {sys.argv[0]} trace.json script.py [args ...]', file=sys.stderr)
+        sys.exit(1)
+    path, script = sys.argv[1], sys.argv[2]
+    sys.argv = sys.argv[2:]
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    rtrace.enable(path)
+    runpy.run_path(script, run_name='__main__')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+""" Adaptive sampling of curves for drawing
+
+    An interval is split while the function at its midpoint deviates
+    from the straight line between its ends by more than tol pixels.
+    Every iteration evaluates all new midpoints in one vectorized call.
+"""
+
+import numpy as np
+
+# Initial uniform points
+NINIT = 17
+MAXPOINTS = 20000
+
+def axis_scales(ax):
+    """ Pixels per data unit along x and y of a linear axes """
+    bbox = ax.get_window_extent()
+    (x0, x1), (y0, y1) = ax.get_xlim(), ax.get_ylim()
+    return bbox.width / abs(x1 - x0), bbox.height / abs(y1 - y0)
+
+def adaptive_sample(func, lo, hi, xscale, yscale, tol=0.25, hints=(), mindx=None,
+                    ylim=None, ninit=NINIT, maxpoints=MAXPOINTS):
+    """ (x, func(x)) sampled on [lo, hi] so that linear interpolation is
+        within tol pixels for xscale, yscale pixels per data unit.
+
+        hints   points always sampled, e.g. both sides of a discontinuity
+                or the peaks of narrow resonances the initial grid misses
+        mindx   intervals are not split below it, default a quarter pixel
+        ylim    values are compared after clipping to ylim so that parts
+                of the curve outside the axes are not refined """
+    mindx = 0.25 / xscale if mindx is None else mindx
+    clip = (lambda y: y) if ylim is None else\
+        (lambda y: np.clip(y, ylim[0] - tol / yscale, ylim[1] + tol / yscale))
+    x = np.unique(np.concatenate([np.linspace(lo, hi, ninit),
+                                  [h for h in hints if lo <= h <= hi]]))
+    y = np.asarray(func(x), dtype=float)
+    active = np.ones(x.size - 1, dtype=bool)
+    while active.any() and x.size < maxpoints:
+        left = np.flatnonzero(active)
+        xm = 0.5 * (x[left] + x[left + 1])
+        ym = np.asarray(func(xm), dtype=float)
+        err = np.abs(clip(ym) - 0.5 * (clip(y[left]) + clip(y[left + 1]))) * yscale
+        split = (err > tol) & (x[left + 1] - x[left] > 2 * mindx)
+
+        x = np.insert(x, left + 1, xm)
+        y = np.insert(y, left + 1, ym)
+        # each interval is replaced by two halves that stay active if split
+        active = np.insert(np.zeros(active.size, dtype=bool), left + 1, False)
+        halves = left + np.arange(left.size)
+        active[halves[split]] = active[halves[split] + 1] = True
+    return x, y
@@ -0,0 +1,142 @@
+#! /usr/bin/env python
+
+""" Consistency checks of the measurement store
+
+    All point checks run as vectorized passes over the store columns:
+        schema     finite values, non-negative uncertainties, required
+                   meta fields
+        error      dRp (dRn) differs from the quadrature sum of statp,
+                   systp and corrp (statn, systn, corrn) by more than
+                   ERRTOL
+        duplicate  several points of one file at the same energy
+        code       the same meta code in several files, two-digit year
+                   of the code differing from meta year
+        bibinfo    meta of a file named after a PDG code differs from
+                   its bibinfo.metainfo entry
+    Duplicate codes within bibinfo.metainfo are reported for bibinfo.py.
+"""
+
+import os
+import numpy as np
+
+from loaddata import COLUMNS, LISTCOLUMNS, DATAPATH, get_store, store_metas
+
+META = {'code': str, 'ref': str, 'doi': str, 'experiment': str, 'year': int, 'comment': str}
+UNCERTAINTIES = ['dEp', 'dEn', 'dRp', 'dRn', 'statp', 'statn']
+# Absolute tolerance of the recomputed errors, the files round to 4 decimals
+ERRTOL = 2e-4
+# Points listed per violation
+MAXPOINTS = 5
+
+def point_index(arrays):
+    """ Experiment index of every store point """
+    offsets = arrays['offsets']
+    return np.repeat(np.arange(offsets.size - 1), np.diff(offsets))
+
+def component_qsum(arrays, key):
+    """ Quadrature sum of the components of key per store point """
+    val, off = arrays[f'{key}_val'], arrays[f'{key}_off']
+    rows = np.repeat(np.arange(off.size - 1), np.diff(off))
+    return np.sqrt(np.bincount(rows, weights=val**2, minlength=off.size - 1))
+
+def point_violations(arrays, check, mask, exp, detail=''):
+    """ (experiment, check, message) per experiment with masked points """
+    pos = np.flatnonzero(mask)
+    if not pos.size:
+        return []
+    offsets, energy = arrays['offsets'], arrays['E']
+    splits = np.flatnonzero(np.diff(exp[pos])) + 1
+    out = []
+    for group in np.split(pos, splits):
+        idx = exp[group[0]]
+        points = ', '.join(f'#{p - offsets[idx]} E={energy[p]:g}' for p in group[:MAXPOINTS])
+        more = f' and {group.size - MAXPOINTS} more' if group.size > MAXPOINTS else ''
+        out.append((idx, check, f'{group.size} points {detail}: {points}{more}'))
+    return out
+
+def check_points(arrays):
+    exp = point_index(arrays)
+    out = []
+    finite = np.logical_and.reduce([np.isfinite(arrays[key]) for key in COLUMNS])
+    out += point_violations(arrays, 'schema', ~finite, exp, 'with non-finite values')
+    negative = np.logical_or.reduce([arrays[key] < 0 for key in UNCERTAINTIES])
+    out += point_violations(arrays, 'schema', negative, exp, 'with negative uncertainties')
+    for key in LISTCOLUMNS:
+        val, off = arrays[f'{key}_val'], arrays[f'{key}_off']
+        rows = np.repeat(np.arange(off.size - 1), np.diff(off))
+        bad = np.zeros(exp.size, dtype=bool)
+        bad[rows[~(val >= 0)]] = True
+        out += point_violations(arrays, 'schema', bad, exp, f'with negative or non-finite {key}')
+
+    for side in 'pn':
+        expected = np.sqrt(arrays[f'stat{side}']**2 + component_qsum(arrays, f'syst{side}')**2 +
+                           component_qsum(arrays, f'corr{side}')**2)
+        mismatch = np.abs(arrays[f'dR{side}'] - expected) > ERRTOL
+        out += point_violations(arrays, 'error', mismatch, exp,
+                                f'with dR{side} not the quadrature sum of its components')
+
+    order = np.lexsort((arrays['E'], exp))
+    same = (exp[order][1:] == exp[order][:-1]) & (arrays['E'][order][1:] == arrays['E'][order][:-1])
+    dup = np.zeros(exp.size, dtype=bool)
+    dup[order[1:][same]] = True
+    out += point_violations(arrays, 'duplicate', dup, exp, 'repeating an energy')
+    return out
+
+def check_metas(metas, metainfo):
+    out = []
+    codes = {}
+    for idx, meta in enumerate(metas):
+        missing = [key for key, kind in META.items() if not isinstance(meta.get(key), kind)]
+        if missing:
+            out.append((idx, 'schema', f'missing or mistyped meta fields {", ".join(missing)}'))
+            continue
+        codes.setdefault(meta['code'], []).append(idx)
+        year = meta['code'].rsplit(' ', 1)[-1]
+        if year.isdigit() and int(year) != meta['year'] % 100:
+            out.append((idx, 'code', f'code {meta["code"]} does not match year {meta["year"]}'))
+        pdgcode = os.path.splitext(meta['file'])[0].replace('_', ' ')
+        entry = metainfo.get(pdgcode)
+        if entry is not None and entry != {key: meta.get(key) for key in entry}:
+            out.append((idx, 'bibinfo', f'meta differs from the bibinfo entry {pdgcode}'))
+    for code, idxs in codes.items():
+        for idx in idxs if len(idxs) > 1 else []:
+            files = ', '.join(metas[other]['file'] for other in idxs if other != idx)
+            out.append((idx, 'code', f'code {code} also used by {files}'))
+    return out
+
+def check_bibinfo(metainfo):
+    """ Messages for metainfo entries sharing a code """
+    keys = {}
+    for key, entry in metainfo.items():
+        keys.setdefault(entry['code'], []).append(key)
+    return [f'code {code} used by {", ".join(names)}' for code, names in keys.items()
+            if len(names) > 1]
+
+def validate_store(arrays):
+    """ {file name: [(check, message), ...]} of the files with violations """
+    from bibinfo import metainfo
+
+    metas = store_metas(arrays)
+    report = {}
+    for idx, check, message in check_points(arrays) + check_metas(metas, metainfo):
+        report.setdefault(metas[idx]['file'], []).append((check, message))
+    bib = [('bibinfo', message) for message in check_bibinfo(metainfo)]
+    if bib:
+        report['bibinfo.py'] = bib
+    return report
+
+def format_report(report):
+    lines = []
+    for fname, violations in sorted(report.items()):
+        lines.append(fname)
+        lines.extend(f'    {check:>9s}: {message}' for check, message in violations)
+    return '\n'.join(lines)
+
+def main():
+    report = validate_store(get_store(DATAPATH))
+    if report:
+        print(format_report(report))
+    print(f'{sum(map(len, report.values()))} violations in {len(report)} files')
+
+if __name__ == '__main__':
+    main()